@@ -0,0 +1,85 @@
+from abm_model.banks import BaseBank, Bank
+from abm_model.population import AgentPopulation, AgentView, install_view_properties
+import numpy as np
+
+
+class BankPopulation(AgentPopulation, BaseBank):
+    """
+    | Struct-of-arrays representation of all banks. The balance sheet variables are stored in contiguous float
+    arrays together with running totals of loan assets, loan liabilities and CDS premium exposure, which are
+    updated when a contract is booked. Every capacity check of a bank is therefore O(1). Indexing the population
+    with a bank id returns a BankView, so code written for Bank objects keeps working.
+    """
+    array_fields = ('equity', 'deposits', 'capital_requirement', 'covered_cds_prob', 'naked_cds_prob',
+                    'max_credit', 'current_deposits', 'deposit_change', 'money_from_firm_loans', 'earnings',
+                    'loan_assets', 'loan_liabilities', 'cds_premium')
+    agent_fields = ('equity', 'deposits', 'capital_requirement', 'covered_cds_prob', 'naked_cds_prob')
+    list_fields = ('assets', 'liabilities')
+    agent_class = Bank
+
+    def __init__(self,
+                 ids: list,
+                 equity,
+                 deposits,
+                 capital_requirement,
+                 covered_cds_prob,
+                 naked_cds_prob):
+        """
+        | Set up the population from the per-bank values, given in the order of the bank ids.
+
+        :param ids: List of unique bank identifiers.
+        :param equity: The equity value of the bank.
+        :param deposits: The current deposit amount of the bank.
+        :param capital_requirement: The capital requirement of the bank.
+        :param covered_cds_prob: The probability of a covered credit default swap (CDS) being used by the bank.
+        :param naked_cds_prob: The probability of a naked CDS being used by the bank.
+        """
+        self._init_arrays(ids, {'equity': equity, 'deposits': deposits, 'capital_requirement': capital_requirement,
+                                'covered_cds_prob': covered_cds_prob, 'naked_cds_prob': naked_cds_prob})
+        self.reset_variables()
+
+    @staticmethod
+    def empty_list_field(name: str):
+        return {'loans': [], 'cds': []}
+
+    @classmethod
+    def from_banks(cls, banks: dict):
+        """
+        | Build a population from a dictionary of Bank objects.
+
+        :param banks: Dictionary of Bank objects keyed by bank id.
+        :return: The BankPopulation.
+        """
+        return cls.from_agents(banks)
+
+    def update_current_deposits(self):
+        """
+        | Set the current deposits of all banks to their deposits, see Bank.update_current_deposits.
+        """
+        self.current_deposits = self.deposits.copy()
+
+    def update_max_credit(self):
+        """
+        | Update the maximum credit of all banks, see Bank.update_max_credit.
+        """
+        self.max_credit = self.deposits / self.capital_requirement
+
+    def reset_variables(self):
+        """
+        | Resets the per-period variables of all banks, see Bank.reset_variables.
+        """
+        for name in ('max_credit', 'current_deposits', 'deposit_change', 'earnings'):
+            getattr(self, name)[:] = np.nan
+        for name in ('money_from_firm_loans', 'loan_assets', 'loan_liabilities', 'cds_premium'):
+            getattr(self, name)[:] = 0
+        self.reset_list_fields()
+
+
+class BankView(AgentView, Bank):
+    """
+    | Bank object view on a single bank of a BankPopulation.
+    """
+
+
+BankPopulation.view_class = BankView
+install_view_properties(BankPopulation)
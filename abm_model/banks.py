@@ -1,7 +1,9 @@
 from abm_model.loan import Loan
+from abm_model.credit_default_swap import hull_cds_spread
 from abm_model.baseclass import BaseAgent
+from abm_model.population import agent_values
+from abm_model.grouping import GroupedIndex
 import numpy as np
-import random
 
 
 class BaseBank(BaseAgent):
@@ -29,6 +31,41 @@ class BaseBank(BaseAgent):
         """
         cls.h_theta = new_value
 
+    @classmethod
+    def price_loan_requests(cls,
+                            loans: list[Loan],
+                            max_credit) -> list:
+        """
+        | Price a batch of loan requests at once. Requests above the maximum credit of the lender are rejected,
+        the others get the interest rate of Bank.asses_loan_requests. The noise of all requests is drawn in a
+        single call, in the same order as one request after the other: two uniforms for a firm loan and one for an
+        interbank loan.
+
+        :param loans: List of Loan objects.
+        :param max_credit: Maximum credit of the lender of each loan, or a single value for all loans.
+        :return: List of the priced loans that could be granted, in the order of the requests.
+        """
+        if len(loans) == 0:
+            return []
+        notional = np.array([loan.notional_amount for loan in loans], dtype=float)
+        fragility = np.array([loan.financial_fragility_borrower for loan in loans], dtype=float)
+        is_firm = np.array([loan.borrower in cls.firm_id_set for loan in loans], dtype=bool)
+        default_probability = np.array([loan.prob_default_borrower if firm else 0
+                                        for loan, firm in zip(loans, is_firm)], dtype=float)
+        accepted = ~(notional > max_credit)
+        draws = np.where(is_firm, 2, 1) * accepted
+        uniforms = cls.streams['loan_pricing'].random(int(draws.sum()))
+        first = np.cumsum(draws)[accepted] - draws[accepted]
+        is_firm, fragility, default_probability = is_firm[accepted], fragility[accepted], default_probability[accepted]
+        gamma = cls.h_theta * uniforms[first]
+        delta = 0.9 + (1.1 - 0.9) * uniforms[np.where(is_firm, first + 1, first)]
+        fragility = np.where(is_firm, (1 + delta * default_probability) * fragility, fragility)
+        interest_rates = cls.policy_rate * (1 + gamma * np.tanh(fragility))
+        loan_offers = [loans[i] for i in np.flatnonzero(accepted)]
+        for loan, interest_rate in zip(loan_offers, interest_rates.tolist()):
+            loan.update_interest_rate(interest_rate)
+        return loan_offers
+
 
 class Bank(BaseBank):
     """
@@ -64,6 +101,10 @@ class Bank(BaseBank):
         self.max_credit = None
         self.assets = {'loans': [], 'cds': []}
         self.liabilities = {'loans': [], 'cds': []}
+        # running totals of the contracts booked in the current period
+        self.loan_assets = 0
+        self.loan_liabilities = 0
+        self.cds_premium = 0
         self.money_from_firm_loans = 0
         self.deposit_change = None
         self.current_deposits = None
@@ -85,28 +126,14 @@ class Bank(BaseBank):
                             loans: list[Loan]) -> list:
         """
         | Asses loan requests received by the bank and returns a list of loan offers made by the bank.
-        It iterates over the loan requests, considering factors such as the borrower type and financial
-        fragility to update the interest rate of the loan offers.
+        The interest rate of a firm loan is policy_rate * (1 + gamma * tanh((1 + delta * p_d) * f)), that of an
+        interbank loan policy_rate * (1 + gamma * tanh(f)), with gamma uniform on [0, h_theta] and delta uniform
+        on [0.9, 1.1]. All requests are priced in one batch, see price_loan_requests.
 
         :param loans: list of Loan objects.
         :return: List of Loans that could be granted.
         """
-        loan_offers = []
-        for loan in loans:
-            if loan.notional_amount > self.max_credit:
-                continue
-            if loan.borrower in self.firm_ids:
-                loan.update_interest_rate(self.policy_rate * (1 + np.random.uniform(0, self.h_theta) *
-                                                              np.tanh((1 + np.random.uniform(0.9, 1.1) *
-                                                                       loan.prob_default_borrower) *
-                                                                      loan.financial_fragility_borrower)))
-                loan_offers.append(loan)
-            else:  # we have an interbank loan
-                # TODO: might be advisable to change how interbank interest rates are computed
-                loan.update_interest_rate(self.policy_rate * (1 + np.random.uniform(0, self.h_theta) *
-                                                              np.tanh(loan.financial_fragility_borrower)))
-                loan_offers.append(loan)
-        return loan_offers
+        return self.price_loan_requests(loans, self.max_credit)
 
     def check_loan(self,
                    loan: Loan):
@@ -118,10 +145,9 @@ class Bank(BaseBank):
         :return: It returns False if it cannot be granted. Otherwise, it returns the difference between the
         available funds and the notional of the loan.
         """
-        if loan.notional_amount + sum([x.notional_amount for x in self.assets['loans']]) > self.max_credit:
+        if loan.notional_amount + self.loan_assets > self.max_credit:
             return False
-        return (self.deposits + sum([x.notional_amount for x in self.liabilities['loans']]) -
-                (loan.notional_amount + sum([x.notional_amount for x in self.assets['loans']])))
+        return self.deposits + self.loan_liabilities - (loan.notional_amount + self.loan_assets)
 
     def check_cds(self,
                   premium: float):
@@ -132,9 +158,8 @@ class Bank(BaseBank):
         :param premium: The CDS premium.
         :return:
         """
-        return (self.deposits + sum([x.notional_amount for x in self.liabilities['loans']]) + self.equity -
-                (sum([x.notional_amount for x in self.assets['loans']]) +
-                 sum([x.spread * x.notional_amount for x in self.assets['cds']])) >= premium)
+        return (self.deposits + self.loan_liabilities + self.equity -
+                (self.loan_assets + self.cds_premium) >= premium)
 
     def get_potential_interbank_loans(self,
                                       credit_needed: float,
@@ -146,13 +171,54 @@ class Bank(BaseBank):
         :param notional_amount: The notional amount of the underlying Loan
         :return: list of potential interbank Loans.
         """
-        financial_fragility = (notional_amount + sum([x.notional_amount for x in self.assets['loans']])) / self.deposits
+        financial_fragility = (notional_amount + self.loan_assets) / self.deposits
+        candidates = [x for x in self.bank_ids if x != self.idx]
+        lenders = self.streams['interbank_market'].integers(0, len(candidates), size=self.max_interbank_loan)
         return [Loan(lender=x, borrower=self.idx,
                      notional_amount=credit_needed,
                      financial_fragility_borrower=financial_fragility)
-                for x in random.choices([x for x in self.bank_ids if x != self.idx], k=self.max_interbank_loan)
+                for x in [candidates[i] for i in lenders]
                 ]
 
+    def add_loan_asset(self,
+                       loan: Loan):
+        """
+        | Books a loan extended by the bank and updates the running total of loan assets.
+
+        :param loan: The extended loan.
+        """
+        self.assets['loans'].append(loan)
+        self.loan_assets += loan.notional_amount
+
+    def add_loan_liability(self,
+                           loan: Loan):
+        """
+        | Books an interbank loan received by the bank and updates the running total of loan liabilities.
+
+        :param loan: The received interbank loan.
+        """
+        self.liabilities['loans'].append(loan)
+        self.loan_liabilities += loan.notional_amount
+
+    def add_cds_asset(self,
+                      cds):
+        """
+        | Books a CDS bought by the bank and updates the running total of CDS premiums.
+
+        :param cds: The bought CDS.
+        """
+        self.assets['cds'].append(cds)
+        self.cds_premium += cds.spread * cds.notional_amount
+
+    def add_cds_liability(self,
+                          cds):
+        """
+        | Books a CDS sold by the bank.
+
+        :param cds: The sold CDS.
+        """
+        self.liabilities['cds'].append(cds)
+
     def decide_cds(self,
                    covered: bool = True) -> int:
         """
@@ -162,9 +228,9 @@ class Bank(BaseBank):
         :return: 1 if a CDS is desired and 0 otherwise.
         """
         if covered:
-            return np.random.binomial(1, self.covered_cds_prob)
+            return self.streams['cds_market'].binomial(1, self.covered_cds_prob)
         else:
-            return np.random.binomial(1, self.naked_cds_prob)
+            return self.streams['cds_market'].binomial(1, self.naked_cds_prob)
 
     def provide_cds_spread(self,
                            loan: Loan) -> float:
@@ -175,14 +241,9 @@ class Bank(BaseBank):
         :param loan: Underlying Loan object on which the CDS is written.
         :return: CDS spread value.
         """
-        R = 0.3
-        q = loan.prob_default_borrower + max(np.random.normal(0, 0.01), 10 ** (-2) - loan.prob_default_borrower)
-        u = 1 / (1 + self.policy_rate)
-        v = 1 / (1 + self.policy_rate)
-        e = 1 / (1 + self.policy_rate)
-        A = loan.interest_rate
-        pi = 1 - q
-        return (1 - R - A * R) * q * v / (q * (u + e) + pi * u)
+        return float(hull_cds_spread(loan.prob_default_borrower, loan.interest_rate,
+                                     self.streams['cds_market'].normal(0, 0.01),
+                                     self.policy_rate))
 
     def reset_variables(self):
         """
@@ -191,7 +252,28 @@ class Bank(BaseBank):
         self.max_credit = None
         self.assets = {'loans': [], 'cds': []}
         self.liabilities = {'loans': [], 'cds': []}
+        self.loan_assets = 0
+        self.loan_liabilities = 0
+        self.cds_premium = 0
         self.money_from_firm_loans = 0
         self.deposit_change = None
         self.current_deposits = None
         self.earnings = None
+
+
+def asses_all_loan_requests(banks: dict,
+                            loans: list) -> list:
+    """
+    | Asses the loan requests of all banks in one batch, see Bank.asses_loan_requests. The requests are grouped by
+    lender and priced in the order of the banks, so the result is the same as assessing the requests bank by bank.
+
+    :param banks: Dictionary of banks or a BankPopulation.
+    :param loans: List of the requested loans of all banks.
+    :return: List of Loans that could be granted.
+    """
+    bank_ids = list(banks)
+    positions = {bank_id: i for i, bank_id in enumerate(bank_ids)}
+    lenders = np.array([positions[loan.lender] for loan in loans], dtype=int)
+    grouped = GroupedIndex(lenders, len(bank_ids))
+    max_credit = np.asarray(agent_values(banks, 'max_credit'), dtype=float)
+    return BaseBank.price_loan_requests([loans[i] for i in grouped.order], max_credit[lenders[grouped.order]])
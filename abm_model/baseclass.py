@@ -6,10 +6,15 @@ class BaseAgent:
     """
     policy_rate = None
     firm_ids = None
+    # set of the firm ids for O(1) membership tests
+    firm_id_set = None
     bank_ids = None
     max_interbank_loan = None
     max_bank_loan = None
     max_cds_requests = None
+    rng = None
+    # RNGRegistry with the named random streams of the model components
+    streams = None
 
     @classmethod
     def change_policy_rate(cls, new_value):
@@ -28,6 +33,7 @@ class BaseAgent:
         :param new_value: New list of firm ids.
         """
         cls.firm_ids = new_value
+        cls.firm_id_set = set(new_value)
 
     @classmethod
     def change_bank_ids(cls, new_value):
@@ -64,3 +70,21 @@ class BaseAgent:
         :param new_value: Maximum number of CDS applications.
         """
         cls.max_cds_requests = new_value
+
+    @classmethod
+    def change_rng(cls, new_value):
+        """
+        | Change the random number generator shared by all agents.
+
+        :param new_value: A numpy.random.Generator instance.
+        """
+        cls.rng = new_value
+
+    @classmethod
+    def change_streams(cls, new_value):
+        """
+        | Change the registry of the named random streams of the model components.
+
+        :param new_value: An RNGRegistry instance.
+        """
+        cls.streams = new_value
@@ -0,0 +1,389 @@
+from abm_model.simulation import Simulation, SimulationConfig
+from abm_model.initialization import generate_random_firms_and_banks
+from abm_model.clear_interbank_market import clear_interbank_market
+from abm_model.create_network_connections import create_network_connections
+from abm_model.credit_default_swap import CDS
+from abm_model.loan import Loan
+from abm_model.logs import EventLog
+import numpy as np
+import subprocess
+import platform
+import argparse
+import datetime
+import time
+import json
+import os
+
+# economy sizes (firms, banks), CDS settings (covered, naked) and clearing sizes of the presets
+presets = {
+    'quick': {'sizes': [(300, 20), (3000, 200)],
+              'cds': [(0.5, 0.1)],
+              'clearing_banks': [20, 200, 2000],
+              'periods': 5},
+    'full': {'sizes': [(300, 20), (3000, 200), (30000, 1000), (100000, 5000)],
+             'cds': [(0, 0), (0.5, 0.1), (1, 0.5)],
+             'clearing_banks': [20, 200, 1000, 2000, 5000],
+             'periods': 10},
+}
+
+
+def timed(function, repeats: int) -> dict:
+    """
+    | Time a function over several repetitions.
+
+    :param function: Function without arguments. If it returns a number, that number is used as the time of the
+        repetition instead of the measured wall time, so that set up work can be excluded.
+    :param repeats: Number of repetitions.
+    :return: Dictionary with the minimum, median and maximum time in seconds.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(result if isinstance(result, float) else time.perf_counter() - start)
+    return {'min': float(np.min(times)), 'median': float(np.median(times)), 'max': float(np.max(times))}
+
+
+def benchmark_simulation(firms: int,
+                         banks: int,
+                         covered_cds_prob: float,
+                         naked_cds_prob: float,
+                         periods: int,
+                         engine: str = 'object',
+                         seed: int = 0) -> dict:
+    """
+    | Time the set up, the first period and the following periods of a simulation.
+
+    :param firms: Number of firms.
+    :param banks: Number of banks.
+    :param covered_cds_prob: Probability a bank wants to buy a covered CDS.
+    :param naked_cds_prob: Probability a bank wants to buy a naked CDS.
+    :param periods: Number of simulated periods, including the first one.
+    :param engine: Engine of the simulation, see SimulationConfig.
+    :param seed: Seed of the run.
+    :return: Dictionary with the times in seconds and the per-phase profile of the run.
+    """
+    config = SimulationConfig(firms=firms, banks=banks, covered_cds_prob=covered_cds_prob,
+                              naked_cds_prob=naked_cds_prob, engine=engine)
+    start = time.perf_counter()
+    simulation = Simulation(config, seed=seed)
+    setup_time = time.perf_counter() - start
+    start = time.perf_counter()
+    simulation.run(1)
+    first_period_time = time.perf_counter() - start
+    start = time.perf_counter()
+    simulation.run(periods - 1)
+    remaining_time = time.perf_counter() - start
+    return {'setup': setup_time,
+            'first_period': first_period_time,
+            'periods': first_period_time + remaining_time,
+            'per_period': (first_period_time + remaining_time) / periods,
+            'phases': {name: stats['total_time'] for name, stats in simulation.profile_report()['phases'].items()}}
+
+
+def synthetic_economy(firms: int,
+                      banks: int,
+                      covered_cds_prob: float,
+                      naked_cds_prob: float,
+                      rng: np.random.Generator) -> tuple:
+    """
+    | Generate firms and banks ready for the network creation of a period.
+
+    :param firms: Number of firms.
+    :param banks: Number of banks.
+    :param covered_cds_prob: Probability a bank wants to buy a covered CDS.
+    :param naked_cds_prob: Probability a bank wants to buy a naked CDS.
+    :param rng: Random number generator.
+    :return: A tuple containing the dictionary of firms and the dictionary of banks.
+    """
+    firms, banks, *_ = generate_random_firms_and_banks([f'firm_{i}' for i in range(1, firms + 1)],
+                                                       [f'bank_{i}' for i in range(1, banks + 1)],
+                                                       covered_cds_prob,
+                                                       naked_cds_prob,
+                                                       rng=rng)
+    for bank in banks.values():
+        bank.update_current_deposits()
+        bank.update_max_credit()
+    return firms, banks
+
+
+def synthetic_loan_offers(firms: dict,
+                          banks: dict,
+                          offers_per_firm: int,
+                          rng: np.random.Generator) -> dict:
+    """
+    | Generate loan offers of random banks to every firm, sorted by interest rate.
+
+    :param firms: Dictionary of firms.
+    :param banks: Dictionary of banks.
+    :param offers_per_firm: Number of offers per firm.
+    :param rng: Random number generator.
+    :return: Dictionary that has as keys the firm ids and as values the offered loans.
+    """
+    bank_ids = list(banks)
+    loan_offers = {}
+    for firm_id, firm in firms.items():
+        credit_demand = firm.equity * rng.uniform(0.1, 1)
+        loans = [Loan(bank_ids[j], firm_id, credit_demand, credit_demand / firm.equity,
+                      firm.default_probability, interest_rate)
+                 for j, interest_rate in zip(rng.integers(0, len(bank_ids), size=offers_per_firm),
+                                             rng.uniform(0.02, 0.06, size=offers_per_firm))]
+        loan_offers[firm_id] = sorted(loans, key=lambda loan: loan.interest_rate)
+    return loan_offers
+
+
+def synthetic_interbank_contracts(firms: dict,
+                                  banks: dict,
+                                  loans_per_bank: int,
+                                  cds_per_bank: int,
+                                  default_share: float,
+                                  rng: np.random.Generator) -> tuple:
+    """
+    | Generate a random network of interbank loans and CDS contracts on firms, some of which have defaulted.
+
+    :param firms: Dictionary of firms.
+    :param banks: Dictionary of banks.
+    :param loans_per_bank: Number of interbank loans taken by every bank.
+    :param cds_per_bank: Number of CDS contracts bought by every bank.
+    :param default_share: Share of defaulted firms.
+    :param rng: Random number generator.
+    :return: A tuple containing the list of contracts and the list of defaulted firms.
+    """
+    bank_ids = list(banks)
+    firm_ids = list(firms)
+    contracts = []
+    for i, bank_id in enumerate(bank_ids):
+        bank = banks[bank_id]
+        bank.money_from_firm_loans = 0
+        bank.deposit_change = rng.normal(0, 0.02) * bank.deposits
+        # counterparties other than the bank itself
+        lenders = (i + rng.integers(1, len(bank_ids), size=loans_per_bank)) % len(bank_ids)
+        contracts += [Loan(bank_ids[j], bank_id, rng.uniform(0.01, 0.1) * bank.deposits, 0, 0,
+                           rng.uniform(0.02, 0.06)) for j in lenders]
+        sellers = (i + rng.integers(1, len(bank_ids), size=cds_per_bank)) % len(bank_ids)
+        contracts += [CDS(bank_id, bank_ids[j], firm_ids[k], 0.05, rng.uniform(0.01, 0.1) * bank.deposits,
+                          rng.uniform(0.01, 0.1))
+                      for j, k in zip(sellers, rng.integers(0, len(firm_ids), size=cds_per_bank))]
+    defaulted_firms = [firm_ids[k] for k in np.flatnonzero(rng.random(len(firm_ids)) < default_share)]
+    for firm_id in defaulted_firms:
+        firms[firm_id].recovery_rate = rng.uniform(0, 1)
+    return contracts, defaulted_firms
+
+
+def benchmark_network(firms: int,
+                      banks: int,
+                      covered_cds_prob: float,
+                      naked_cds_prob: float,
+                      repeats: int = 3,
+                      seed: int = 0) -> dict:
+    """
+    | Time create_network_connections on synthetic loan offers.
+
+    :param firms: Number of firms.
+    :param banks: Number of banks.
+    :param covered_cds_prob: Probability a bank wants to buy a covered CDS.
+    :param naked_cds_prob: Probability a bank wants to buy a naked CDS.
+    :param repeats: Number of repetitions, each on a newly generated economy.
+    :param seed: Seed of the synthetic economy.
+    :return: Dictionary with the minimum, median and maximum time in seconds.
+    """
+    rng = np.random.default_rng(seed)
+
+    def run():
+        firm_agents, bank_agents = synthetic_economy(firms, banks, covered_cds_prob, naked_cds_prob, rng)
+        loan_offers = synthetic_loan_offers(firm_agents, bank_agents, 3, rng)
+        start = time.perf_counter()
+        create_network_connections(loan_offers, bank_agents, firm_agents, EventLog(), list(bank_agents),
+                                   covered_cds_prob, naked_cds_prob, 0)
+        return time.perf_counter() - start
+    return timed(run, repeats)
+
+
+def benchmark_clearing(banks: int,
+                       loans_per_bank: int = 2,
+                       cds_per_bank: int = 3,
+                       default_share: float = 0.05,
+                       repeats: int = 3,
+                       seed: int = 0) -> dict:
+    """
+    | Time clear_interbank_market on a synthetic interbank network.
+
+    :param banks: Number of banks.
+    :param loans_per_bank: Number of interbank loans taken by every bank.
+    :param cds_per_bank: Number of CDS contracts bought by every bank.
+    :param default_share: Share of defaulted firms.
+    :param repeats: Number of repetitions, each on a newly generated network.
+    :param seed: Seed of the synthetic network.
+    :return: Dictionary with the minimum, median and maximum time in seconds.
+    """
+    rng = np.random.default_rng(seed)
+
+    def run():
+        firm_agents, bank_agents = synthetic_economy(max(banks, 100), banks, 0, 0, rng)
+        contracts, defaulted_firms = synthetic_interbank_contracts(firm_agents, bank_agents, loans_per_bank,
+                                                                   cds_per_bank, default_share, rng)
+        start = time.perf_counter()
+        clear_interbank_market(bank_agents, firm_agents, list(bank_agents), contracts, defaulted_firms)
+        return time.perf_counter() - start
+    return timed(run, repeats)
+
+
+def metadata() -> dict:
+    """
+    | Describe the environment of a benchmark run.
+
+    :return: Dictionary with the git commit, the versions and the time of the run.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'time': datetime.datetime.now().isoformat(timespec='seconds')}
+
+
+def run_benchmarks(sizes: list,
+                   cds: list,
+                   clearing_banks: list,
+                   periods: int,
+                   engines: tuple = ('object',),
+                   repeats: int = 3) -> dict:
+    """
+    | Run the benchmark suite.
+
+    :param sizes: List of (firms, banks) tuples of the simulation and network benchmarks.
+    :param cds: List of (covered_cds_prob, naked_cds_prob) tuples.
+    :param clearing_banks: List of the numbers of banks of the clearing benchmark.
+    :param periods: Number of periods of the simulation benchmark.
+    :param engines: Engines of the simulation benchmark.
+    :param repeats: Number of repetitions of the network and clearing benchmarks.
+    :return: Dictionary with the metadata and the list of results.
+    """
+    results = []
+    for firms, banks in sizes:
+        for covered_cds_prob, naked_cds_prob in cds:
+            parameters = {'firms': firms, 'banks': banks, 'covered_cds_prob': covered_cds_prob,
+                          'naked_cds_prob': naked_cds_prob}
+            for engine in engines:
+                results.append({'benchmark': 'simulation', 'parameters': dict(parameters, engine=engine,
+                                                                              periods=periods),
+                                'times': benchmark_simulation(firms, banks, covered_cds_prob, naked_cds_prob,
+                                                              periods, engine=engine)})
+            results.append({'benchmark': 'create_network_connections', 'parameters': parameters,
+                            'times': benchmark_network(firms, banks, covered_cds_prob, naked_cds_prob,
+                                                       repeats=repeats)})
+    for banks in clearing_banks:
+        results.append({'benchmark': 'clear_interbank_market', 'parameters': {'banks': banks},
+                        'times': benchmark_clearing(banks, repeats=repeats)})
+    return {'metadata': metadata(), 'results': results}
+
+
+def result_key(result: dict) -> str:
+    """
+    | Key that identifies a benchmark across result files.
+
+    :param result: A single benchmark result.
+    :return: The key.
+    """
+    return result['benchmark'] + json.dumps(result['parameters'], sort_keys=True)
+
+
+def headline_time(times: dict) -> float:
+    """
+    | Time used to compare benchmarks: the per-period time of simulations, the median otherwise.
+
+    :param times: Times of a benchmark result.
+    :return: The time in seconds.
+    """
+    return times['per_period'] if 'per_period' in times else times['median']
+
+
+def compare(baseline: dict, results: dict) -> list:
+    """
+    | Compare the results of two benchmark runs.
+
+    :param baseline: Benchmark results of the reference commit.
+    :param results: Benchmark results of the new commit.
+    :return: List of tuples (benchmark, parameters, baseline time, new time, ratio) of the common benchmarks.
+    """
+    baseline_times = {result_key(result): headline_time(result['times']) for result in baseline['results']}
+    comparison = []
+    for result in results['results']:
+        key = result_key(result)
+        if key in baseline_times:
+            new_time = headline_time(result['times'])
+            comparison.append((result['benchmark'], result['parameters'], baseline_times[key], new_time,
+                               new_time / baseline_times[key]))
+    return comparison
+
+
+def parse_size(value: str) -> tuple:
+    """
+    | Parse an economy size of the form FIRMSxBANKS.
+
+    :param value: The size, e.g. '3000x200'.
+    :return: Tuple (firms, banks).
+    """
+    firms, banks = value.lower().split('x')
+    return int(firms), int(banks)
+
+
+def parse_cds(value: str) -> tuple:
+    """
+    | Parse a CDS setting of the form COVERED,NAKED.
+
+    :param value: The setting, e.g. '0.5,0.1'.
+    :return: Tuple (covered_cds_prob, naked_cds_prob).
+    """
+    covered, naked = value.split(',')
+    return float(covered), float(naked)
+
+
+def main(argv: list = None):
+    """
+    | Command line interface of the benchmark suite.
+
+    :param argv: Command line arguments, sys.argv is used if None.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the simulation, the network creation and the '
+                                                 'interbank clearing.')
+    parser.add_argument('--preset', choices=list(presets), default='quick', help='grid of benchmarks to run')
+    parser.add_argument('--size', action='append', type=parse_size, help='FIRMSxBANKS, overrides the preset')
+    parser.add_argument('--cds', action='append', type=parse_cds, help='COVERED,NAKED, overrides the preset')
+    parser.add_argument('--clearing-banks', type=lambda value: [int(x) for x in value.split(',')],
+                        help='comma separated numbers of banks, overrides the preset')
+    parser.add_argument('--periods', type=int, help='periods per simulation, overrides the preset')
+    parser.add_argument('--engine', action='append', choices=['object', 'array'], help='simulation engine')
+    parser.add_argument('--repeats', type=int, default=3, help='repetitions of the isolated benchmarks')
+    parser.add_argument('--output', default='benchmark.json', help='path of the JSON result file')
+    parser.add_argument('--compare', help='JSON result file of a previous run to compare against')
+    args = parser.parse_args(argv)
+
+    preset = presets[args.preset]
+    results = run_benchmarks(args.size or preset['sizes'],
+                             args.cds or preset['cds'],
+                             preset['clearing_banks'] if args.clearing_banks is None else args.clearing_banks,
+                             args.periods or preset['periods'],
+                             engines=tuple(args.engine or ['object']),
+                             repeats=args.repeats)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    for result in results['results']:
+        print(f"{result['benchmark']:<28}{json.dumps(result['parameters']):<100}"
+              f"{headline_time(result['times']):>10.4f} s")
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"\ncompared to {baseline['metadata']['commit']}")
+        for benchmark, parameters, baseline_time, new_time, ratio in compare(baseline, results):
+            print(f"{benchmark:<28}{json.dumps(parameters):<100}{baseline_time:>10.4f} s{new_time:>10.4f} s"
+                  f"{ratio:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
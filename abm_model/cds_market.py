@@ -0,0 +1,122 @@
+from abm_model.credit_default_swap import CDS, hull_cds_spread
+from abm_model.banks import BaseBank
+from abm_model.loan import Loan
+from abm_model.population import agent_values
+from abm_model.grouping import GroupedIndex
+import numpy as np
+
+
+class CDSMarket:
+    """
+    | Vectorized CDS market. For an extended loan the interest of all banks in buying a CDS is drawn in one call,
+    the counterparties of all buyers are sampled at once from the banks that are neither the lender nor a buyer,
+    all quotes are priced at once and the best (smallest) spread of every buyer is selected with array operations.
+    """
+    def __init__(self,
+                 banks: dict,
+                 banks_idx: list,
+                 rng: np.random.Generator):
+        """
+        | Read the CDS probabilities of the banks.
+
+        :param banks: Dictionary of banks or a BankPopulation.
+        :param banks_idx: List of bank ids from which the counterparties are drawn.
+        :param rng: Random number generator.
+        """
+        self.rng = rng
+        self.bank_ids = list(banks)
+        self.positions = {bank_id: i for i, bank_id in enumerate(self.bank_ids)}
+        self.covered_cds_prob = np.asarray(agent_values(banks, 'covered_cds_prob'), dtype=float)
+        self.naked_cds_prob = np.asarray(agent_values(banks, 'naked_cds_prob'), dtype=float)
+        # positions of the potential counterparties in the order of banks_idx
+        self.counterparties = np.array([self.positions[bank_id] for bank_id in banks_idx], dtype=int)
+
+    def best_offers(self, loan: Loan) -> list:
+        """
+        | Collect the best CDS offer of every bank that wants to buy a CDS on a loan. The lender buys a covered
+        CDS with its covered CDS probability, every other bank a naked CDS with its naked CDS probability. Every
+        buyer asks max_cds_requests random counterparties for a quote.
+
+        :param loan: The extended loan.
+        :return: List of CDS offers, one per buyer in the order of the banks.
+        """
+        lender = self.positions[loan.lender]
+        probabilities = self.naked_cds_prob.copy()
+        probabilities[lender] = self.covered_cds_prob[lender]
+        interested = self.rng.binomial(1, probabilities).astype(bool)
+        buyers = np.flatnonzero(interested)
+        if buyers.size == 0:
+            return []
+        excluded = interested.copy()
+        excluded[lender] = True
+        candidates = self.counterparties[~excluded[self.counterparties]]
+        if candidates.size == 0:
+            return []
+        sellers = candidates[self.rng.integers(0, candidates.size, size=(buyers.size, BaseBank.max_cds_requests))]
+        # price all quotes with the one-period Hull model, every quote with its own perturbation of the seller
+        spreads = hull_cds_spread(loan.prob_default_borrower, loan.interest_rate,
+                                  self.rng.normal(0, 0.01, size=sellers.shape), BaseBank.policy_rate)
+        # first quote with the smallest spread, like a stable sort by spread
+        best = np.argmin(spreads, axis=1)
+        rows = np.arange(buyers.size)
+        return [CDS(self.bank_ids[buyer], self.bank_ids[seller], loan.borrower, loan.prob_default_borrower,
+                    loan.notional_amount, spread, reference_rate=loan.interest_rate)
+                for buyer, seller, spread in zip(buyers.tolist(), sellers[rows, best].tolist(),
+                                                 spreads[rows, best].tolist())]
+
+
+class ReferenceCDSMarket:
+    """
+    | CDS market of the reference implementation. Every bank decides on its own with Bank.decide_cds whether it
+    wants a CDS on a loan, and every quote is priced by its seller with Bank.provide_cds_spread, so the random
+    numbers are drawn one by one in the order of the reference runs and of the golden run of the object engine.
+    """
+    def __init__(self,
+                 banks: dict,
+                 banks_idx: list,
+                 rng: np.random.Generator):
+        """
+        | Set up the market.
+
+        :param banks: Dictionary of banks.
+        :param banks_idx: List of bank ids from which the counterparties are drawn.
+        :param rng: Random number generator of the counterparty draws.
+        """
+        self.rng = rng
+        self.banks = banks
+        self.banks_idx = banks_idx
+
+    def best_offers(self, loan: Loan) -> list:
+        """
+        | Collect the best CDS offer of every bank that wants to buy a CDS on a loan, see CDSMarket.best_offers.
+
+        :param loan: The extended loan.
+        :return: List of CDS offers, one per buyer in the order of the banks.
+        """
+        banks = self.banks
+        # determine which banks want cds on this loan
+        interested_cds_buyers = [bank_id for bank_id in banks if
+                                 (banks[bank_id].decide_cds(covered=(loan.lender == bank_id)))]
+        # for each interested buyer, get offers from various bank according to max_cds_requests,
+        # including only banks that are neither the lender bank itself nor any interested buyer (and
+        # neither the bank as its own counterparty)
+        cds_offers = []
+        for bank_id_buyer in interested_cds_buyers:
+            candidates = [x for x in self.banks_idx if (x != banks[bank_id_buyer].idx and x != loan.lender
+                                                        and x not in interested_cds_buyers)]
+            if len(candidates) == 0:
+                continue
+            cds_offers += [
+                CDS(bank_id_buyer, counterparty_id, loan.borrower, loan.prob_default_borrower,
+                    loan.notional_amount, banks[counterparty_id].provide_cds_spread(loan),
+                    reference_rate=loan.interest_rate)
+                for counterparty_id in [candidates[i] for i in
+                                        self.rng.integers(0, len(candidates),
+                                                          size=banks[bank_id_buyer].max_cds_requests)]]
+
+        # only consider the best offer (smallest spread) of every buyer
+        buyer_positions = {bank_id: i for i, bank_id in enumerate(interested_cds_buyers)}
+        grouped_offers = GroupedIndex([buyer_positions[cds.buyer] for cds in cds_offers],
+                                      len(interested_cds_buyers),
+                                      order_by=[cds.spread for cds in cds_offers])
+        return [cds_offers[i] for i in grouped_offers.first()]
@@ -1,4 +1,151 @@
 from abm_model.markov_model import MarkovModel
+from abm_model.baseclass import BaseAgent
+from abm_model.population import AgentPopulation, agent_values, set_agent_values
+import numpy as np
+
+
+def adjust_production(firms: dict):
+    """
+    | Adjust the production of all firms to their available funds. A firm that could not fund all its wages
+    reduces its supply to what its equity can pay.
+
+    :param firms: Dictionary with all firms or a FirmPopulation.
+    """
+    equity = np.array(agent_values(firms, 'equity'), dtype=float)
+    total_wages = np.array(agent_values(firms, 'total_wages'), dtype=float)
+    supply = np.array(agent_values(firms, 'supply'), dtype=float)
+    productivity = np.asarray(agent_values(firms, 'productivity'), dtype=float)
+    wage = np.asarray(agent_values(firms, 'wage'), dtype=float)
+    short = total_wages != equity
+    set_agent_values(firms, 'supply', np.where(short, equity * productivity / wage, supply))
+    set_agent_values(firms, 'total_wages', np.where(short, equity, total_wages))
+
+
+def produce_supply_consumption(firms: dict,
+                               rng: np.random.Generator,
+                               min_consumption: float,
+                               max_consumption: float,
+                               overall_consumption: float,
+                               consumption_std: float):
+    """
+    | Pay the wages of all firms and sell a random share of their supply, clipped between the minimum and maximum
+    consumption, at their prices. The consumption shocks of all firms are drawn in one call, in the order of the
+    firms.
+
+    :param firms: Dictionary with all firms or a FirmPopulation.
+    :param rng: Random number generator.
+    :param min_consumption: The minimum consumption as a percentage between 0 and 1.
+    :param max_consumption: The maximum consumption as a percentage between 0 and 1.
+    :param overall_consumption: The overall consumption.
+    :param consumption_std: The standard deviation of consumption.
+    """
+    equity = np.array(agent_values(firms, 'equity'), dtype=float)
+    total_wages = np.array(agent_values(firms, 'total_wages'), dtype=float)
+    supply = np.array(agent_values(firms, 'supply'), dtype=float)
+    consumption = np.clip(rng.normal(overall_consumption, consumption_std, len(equity)),
+                          min_consumption, max_consumption)
+    set_agent_values(firms, 'prev_equity', equity)
+    set_agent_values(firms, 'equity', equity - total_wages +
+                     np.asarray(agent_values(firms, 'price'), dtype=float) * consumption * supply)
+    set_agent_values(firms, 'excess_supply', (1 - consumption) * supply)
+
+
+def clear_goods_market(firms: dict,
+                       rng: np.random.Generator,
+                       min_consumption: float,
+                       max_consumption: float,
+                       overall_consumption: float,
+                       consumption_std: float):
+    """
+    | Adjust the production of all firms to their available funds and clear the goods market, see
+    adjust_production and produce_supply_consumption.
+
+    :param firms: Dictionary with all firms or a FirmPopulation.
+    :param rng: Random number generator.
+    :param min_consumption: The minimum consumption as a percentage between 0 and 1.
+    :param max_consumption: The maximum consumption as a percentage between 0 and 1.
+    :param overall_consumption: The overall consumption.
+    :param consumption_std: The standard deviation of consumption.
+    """
+    adjust_production(firms)
+    produce_supply_consumption(firms, rng, min_consumption, max_consumption, overall_consumption, consumption_std)
+
+
+def firm_debt(firms: dict) -> np.ndarray:
+    """
+    | Compute the outstanding debt, interest included, of every firm.
+
+    :param firms: Dictionary with all firms or a FirmPopulation.
+    :return: Array with the debt of each firm.
+    """
+    firm_loans = agent_values(firms, 'loans')
+    borrowers = np.repeat(np.arange(len(firm_loans)), [len(loans) for loans in firm_loans])
+    amounts_due = np.array([(1 + loan.interest_rate) * loan.notional_amount
+                            for loans in firm_loans for loan in loans], dtype=float)
+    return np.bincount(borrowers, weights=amounts_due, minlength=len(firm_loans)).astype(float)
+
+
+def check_default(firms: dict) -> np.ndarray:
+    """
+    | Check which firms cannot repay their debt with their equity.
+
+    :param firms: Dictionary with all firms or a FirmPopulation.
+    :return: Boolean array that is True for the defaulted firms.
+    """
+    return np.array(agent_values(firms, 'equity'), dtype=float) < firm_debt(firms)
+
+
+def firm_loan_arrays(firms: dict,
+                     banks: dict) -> tuple:
+    """
+    | Flatten the loans of all firms into arrays, in the order of the firms and of their loans.
+
+    :param firms: Dictionary with all firms or a FirmPopulation.
+    :param banks: Dictionary with all banks or a BankPopulation.
+    :return: A tuple containing the position of the borrowing firm, the position of the lending bank and the
+        amount due, interest included, of every loan.
+    """
+    bank_positions = {bank_id: i for i, bank_id in enumerate(banks)}
+    firm_loans = agent_values(firms, 'loans')
+    borrowers = np.repeat(np.arange(len(firm_loans)), [len(loans) for loans in firm_loans])
+    lenders = np.array([bank_positions[loan.lender] for loans in firm_loans for loan in loans], dtype=int)
+    amounts_due = np.array([(1 + loan.interest_rate) * loan.notional_amount
+                            for loans in firm_loans for loan in loans], dtype=float)
+    return borrowers, lenders, amounts_due
+
+
+def settle_firm_loans(firms: dict,
+                      banks: dict) -> np.ndarray:
+    """
+    | Find the defaulted firms and repay the firm loans. A solvent firm repays its loans in full, a defaulted firm
+    repays its remaining equity pro rata, which is also the recovery rate of the CDS written on it. The debt of
+    every firm and the repayments to every bank are summed with np.bincount.
+
+    :param firms: Dictionary with all firms or a FirmPopulation.
+    :param banks: Dictionary with all banks or a BankPopulation.
+    :return: Boolean array that is True for the defaulted firms.
+    """
+    borrowers, lenders, amounts_due = firm_loan_arrays(firms, banks)
+    equity = np.array(agent_values(firms, 'equity'), dtype=float)
+    debt = np.bincount(borrowers, weights=amounts_due, minlength=len(equity))
+    defaulted = equity < debt
+    repayment = np.where(defaulted, equity, debt)
+    # repayment of every loan, summed per bank
+    has_loans = np.bincount(borrowers, minlength=len(equity)) > 0
+    payments = amounts_due * repayment[borrowers] / debt[borrowers]
+    money_from_firm_loans = np.asarray(agent_values(banks, 'money_from_firm_loans'), dtype=float)
+    set_agent_values(banks, 'money_from_firm_loans',
+                     money_from_firm_loans + np.bincount(lenders, weights=payments, minlength=len(banks)))
+    set_agent_values(firms, 'equity', equity - repayment)
+    # the recovery rate is only needed for firms with a loan
+    recovery_rate = repayment[has_loans] / debt[has_loans]
+    if isinstance(firms, AgentPopulation):
+        firms.recovery_rate[has_loans] = recovery_rate
+    else:
+        firm_ids = list(firms)
+        for i, value in zip(np.flatnonzero(has_loans).tolist(), recovery_rate.tolist()):
+            firms[firm_ids[i]].recovery_rate = value
+    return defaulted
 
 
 def clear_firm_default(firms: dict,
@@ -7,46 +154,31 @@ def clear_firm_default(firms: dict,
                        good_consumption: list,
                        good_consumption_std: list,
                        min_consumption: float,
-                       max_consumption: float):
+                       max_consumption: float,
+                       rng: np.random.Generator = None):
     """
     |Clear the good markets and see what firms default. Additionally, for each CDS compute the recovery rate.
 
-    :param firms: Dictionary with all firms.
+    :param firms: Dictionary with all firms or a FirmPopulation.
     :param banks: Dictionary with all banks.
     :param economy_state: The economy state modelled as a Markov Model.
     :param good_consumption: Average good consumption for the different economy states.
     :param good_consumption_std: Standard deviation for the good consumption for the different economy states.
     :param min_consumption: Minimum consumption of goods.
     :param max_consumption: Maximum consumption of goods.
+    :param rng: Random number generator of the consumption. The consumption stream of the agents if None.
     :return: A tuple containing the updated firms dictionary, banks dictionary, and a list of defaulted firms.
     """
-
     # adjust production based on Credit Market & do the good consumption market
-    overall_consumption = good_consumption[economy_state.current_state]
-    consumption_std = good_consumption_std[economy_state.current_state]
-    for firm_id in firms.keys():
-        firms[firm_id].adjust_production()
-        firms[firm_id].produce_supply_consumption(min_consumption,
-                                                  max_consumption,
-                                                  overall_consumption,
-                                                  consumption_std)
-
-    # see which firms remain solvent
-    defaulted_firms = [firms[firm_id].idx for firm_id in firms.keys() if firms[firm_id].check_default()]
+    clear_goods_market(firms,
+                       BaseAgent.streams['consumption'] if rng is None else rng,
+                       min_consumption,
+                       max_consumption,
+                       good_consumption[economy_state.current_state],
+                       good_consumption_std[economy_state.current_state])
     # clear firm loan payments and update cds with recovery rate
-    for firm_id in firms.keys():
-        loans = firms[firm_id].loans
-        total_loans = sum([(1 + loan.interest_rate) * loan.notional_amount for loan in loans])
-        adjustment_factor = total_loans if firm_id not in defaulted_firms else firms[firm_id].equity
-        for loan in loans:
-            # payback
-            banks[loan.lender].money_from_firm_loans += ((1 + loan.interest_rate) * loan.notional_amount
-                                                         * adjustment_factor / total_loans)
-
-        firms[firm_id].equity -= adjustment_factor
-        # now compute recovery rate for any cds written on the current firm, given firm does have a loan
-        # recovery rate not needed otherwise
-        if len(loans) > 0:
-            firms[firm_id].recovery_rate = adjustment_factor / total_loans
+    defaulted = settle_firm_loans(firms, banks)
+    firm_ids = list(firms)
+    defaulted_firms = [firm_ids[i] for i in np.flatnonzero(defaulted)]
 
     return firms, banks, defaulted_firms
@@ -1,12 +1,18 @@
 from abm_model.loan import Loan
+from abm_model.registry import AgentRegistry
 import numpy as np
 
+# number of banks from which on the liabilities are stored in a sparse matrix
+sparse_threshold = 1000
+
 
 def clear_interbank_market(banks: dict,
                            firms: dict,
                            banks_idx: list,
                            interbank_contracts: list,
-                           defaulted_firms: list) -> tuple:
+                           defaulted_firms: list,
+                           clearing_info: dict = None,
+                           registry: AgentRegistry = None) -> tuple:
     """
     | Perform the market clearing for the interbank market.
 
@@ -15,55 +21,61 @@ def clear_interbank_market(banks: dict,
     :param banks_idx: A list of bank indices.
     :param interbank_contracts: A list of interbank contracts.
     :param defaulted_firms: A list of defaulted firms.
+    :param clearing_info: Optional dictionary that is filled with the number of iterations and the residual of the
+        clearing and the number of banks in default after the clearing.
+    :param registry: Optional bank registry. If given, the slots of the registry are used as matrix indices,
+        otherwise the banks are indexed by their position in the sorted banks_idx.
     :return: A tuple containing the updated banks dictionary and a list of defaulted banks.
     """
-
-    banks_idx.sort(key=lambda idx: int(idx[5:]))
-    num_banks = len(banks_idx)
-    # create liability matrix
-    liabilities = np.zeros(shape=(num_banks, num_banks))
+    if registry is None:
+        banks_idx.sort(key=lambda idx: int(idx[5:]))
+        slots = {bank_id: i for i, bank_id in enumerate(banks_idx)}
+        num_banks = len(banks_idx)
+    else:
+        slots = registry.slots
+        num_banks = registry.capacity
+    bank_slots = np.array([slots[bank_id] for bank_id in banks_idx], dtype=int)
+    defaulted_firms_set = set(defaulted_firms)
+    # collect the liabilities in coordinate form
+    rows, cols, values = [], [], []
     for contract in interbank_contracts:
         if type(contract) == Loan:
-            buyer = banks_idx.index(contract.borrower)
-            seller = banks_idx.index(contract.lender)
-            liabilities[buyer, seller] += contract.notional_amount * (1 + contract.interest_rate)
+            buyer = slots[contract.borrower]
+            seller = slots[contract.lender]
+            rows.append(buyer)
+            cols.append(seller)
+            values.append(contract.notional_amount * (1 + contract.interest_rate))
         else:
-            buyer = banks_idx.index(contract.buyer)
-            seller = banks_idx.index(contract.seller)
-            if contract.reference_entity in defaulted_firms:
-                liabilities[seller, buyer] += (contract.notional_amount *
-                                               (1 - firms[contract.reference_entity].recovery_rate))
-            liabilities[buyer, seller] += contract.spread * contract.notional_amount
+            buyer = slots[contract.buyer]
+            seller = slots[contract.seller]
+            if contract.reference_entity in defaulted_firms_set:
+                rows.append(seller)
+                cols.append(buyer)
+                values.append(contract.notional_amount * (1 - firms[contract.reference_entity].recovery_rate))
+            rows.append(buyer)
+            cols.append(seller)
+            values.append(contract.spread * contract.notional_amount)
+    liabilities = liability_matrix(rows, cols, values, num_banks)
 
-    Lbar = np.sum(liabilities, axis=1)
-    Pi = np.matmul(np.diag(1 / Lbar), liabilities)
-    Pi[Lbar == 0, :] = 0
-    default = True
-    default_set = 0.0
-    payments = Lbar.copy()
     # TODO: something is wrong here, how to adjust initial wealth: we only shift liabilities
     #  but i could save other banks by using deposits
-    initial_wealth = np.array([banks[idx].equity + banks[idx].money_from_firm_loans +
-                               min([banks[idx].deposit_change, 0]) for idx in banks_idx])
-    while default:
-        wealth = initial_wealth + np.matmul(Pi.T, payments)
-        old_payments = payments.copy()
-        default_set = [i for i in range(len(wealth)) if (wealth[i] - Lbar[i]) < 0]
-        payments[default_set] = wealth[default_set]
-        if sum(1 for i in range(len(payments)) if np.abs(payments[i] - old_payments[i]) < 10 ** -6) == len(Lbar):
-            default = False
+    initial_wealth = np.zeros(num_banks)
+    initial_wealth[bank_slots] = [banks[idx].equity + banks[idx].money_from_firm_loans +
+                                  min([banks[idx].deposit_change, 0]) for idx in banks_idx]
+    payments, default_mask, inflows, iterations, residual = clearing_vector(liabilities, initial_wealth)
     # now do the payments
-    for bank_id, index in zip(banks_idx, range(len(banks_idx))):
-        banks[bank_id].earnings = (banks[bank_id].equity + banks[bank_id].money_from_firm_loans +
-                                   min([banks[bank_id].deposit_change, 0]) + np.matmul(Pi.T, payments)[index]
-                                   - payments[index])
+    earnings = initial_wealth + inflows - payments
+    for bank_id, index in zip(banks_idx, bank_slots):
+        banks[bank_id].earnings = earnings[index]
 
     # check defaulting banks now
-    defaulted_banks = [banks_idx[idx] for idx in default_set]
-    print(f'default from clearing: {len(defaulted_banks)}')
-    for bank_id in banks_idx:
+    defaulted_banks = [bank_id for bank_id, index in zip(banks_idx, bank_slots) if default_mask[index]]
+    if clearing_info is not None:
+        clearing_info.update({'iterations': iterations, 'residual': residual,
+                              'clearing_defaults': len(defaulted_banks)})
+    for bank_id, cleared_default in zip(banks_idx, default_mask[bank_slots]):
         money_for_deposits = banks[bank_id].deposits - banks[bank_id].current_deposits - max([banks[bank_id].deposit_change, 0])
-        if bank_id in defaulted_banks or banks[bank_id].earnings < money_for_deposits:
+        if cleared_default or banks[bank_id].earnings < money_for_deposits:
             #  bank is in default
             defaulted_banks.append(bank_id)
             banks[bank_id].equity = 0
@@ -75,5 +87,190 @@ def clear_interbank_market(banks: dict,
             banks[bank_id].deposits = banks[bank_id].current_deposits + max([banks[bank_id].deposit_change, 0])
             banks[bank_id].equity = banks[bank_id].earnings - money_for_deposits
     defaulted_banks = list(np.unique(defaulted_banks))
-    print(f'default total: {len(defaulted_banks)}')
     return banks, defaulted_banks
+
+
+def liability_matrix(rows: list,
+                     cols: list,
+                     values: list,
+                     num_banks: int,
+                     sparse: bool = None):
+    """
+    | Build the liability matrix from its entries in coordinate form, summing duplicate entries. From
+    sparse_threshold banks on a scipy.sparse CSR matrix is returned, since every bank only has a handful of
+    interbank contracts. A dense array is returned if scipy is not available.
+
+    :param rows: Indices of the debtor banks.
+    :param cols: Indices of the creditor banks.
+    :param values: Nominal amounts owed.
+    :param num_banks: Number of banks.
+    :param sparse: Force the sparse (True) or the dense (False) representation. Chosen by size if None.
+    :return: The liability matrix.
+    """
+    if sparse is None:
+        sparse = num_banks >= sparse_threshold
+    if sparse:
+        try:
+            from scipy.sparse import coo_matrix
+        except ImportError:
+            sparse = False
+    if sparse:
+        return coo_matrix((np.array(values, dtype=float), (np.array(rows, dtype=int), np.array(cols, dtype=int))),
+                          shape=(num_banks, num_banks)).tocsr()
+    liabilities = np.zeros(shape=(num_banks, num_banks))
+    np.add.at(liabilities, (np.array(rows, dtype=int), np.array(cols, dtype=int)), np.array(values, dtype=float))
+    return liabilities
+
+
+def is_sparse(matrix) -> bool:
+    """
+    | Check if a matrix is a scipy.sparse matrix.
+
+    :param matrix: The matrix.
+    :return: True if the matrix is sparse.
+    """
+    try:
+        from scipy.sparse import issparse
+    except ImportError:
+        return False
+    return issparse(matrix)
+
+
+def clearing_vector(liabilities: np.ndarray,
+                    initial_wealth: np.ndarray) -> tuple:
+    """
+    | Compute the Eisenberg & Noe (2001) clearing payments with the fictitious default algorithm. Starting from
+    full payment, the banks that cannot meet their liabilities are declared in default and the payments of the
+    defaulted banks are solved exactly given the payments of all other banks. The default set only grows, so the
+    algorithm stops after at most as many iterations as there are banks. A defaulted bank pays out its whole
+    wealth, as in the original fixed point iteration of the model.
+
+    :param liabilities: Dense or sparse matrix with the nominal liabilities of bank i (row) towards bank j (column).
+    :param initial_wealth: Wealth of each bank before the interbank payments.
+    :return: A tuple containing the payment vector, the default mask, the interbank inflows of each bank, the
+        number of iterations and the residual of the fixed point.
+    """
+    if is_sparse(liabilities):
+        return sparse_clearing_vector(liabilities, initial_wealth)
+    num_banks = len(initial_wealth)
+    Lbar = np.sum(liabilities, axis=1)
+    # relative liabilities by row scaling, banks without liabilities have a zero row
+    Pi = np.divide(liabilities, Lbar[:, None], out=np.zeros_like(liabilities, dtype=float), where=Lbar[:, None] > 0)
+    payments = Lbar.astype(float)
+    default_mask = np.zeros(num_banks, dtype=bool)
+    iterations = 0
+    inflows = Pi.T @ payments
+    while iterations < max(num_banks, 1):
+        iterations += 1
+        new_default_mask = default_mask | (initial_wealth + inflows - Lbar < 0)
+        if iterations > 1 and np.array_equal(new_default_mask, default_mask):
+            break
+        default_mask = new_default_mask
+        if not default_mask.any():
+            break
+        # payments of the defaulted banks given full payment of the solvent ones
+        D = default_mask
+        system = np.eye(int(D.sum())) - Pi[np.ix_(D, D)].T
+        rhs = initial_wealth[D] + Pi[np.ix_(~D, D)].T @ Lbar[~D]
+        try:
+            payments[D] = np.linalg.solve(system, rhs)
+        except np.linalg.LinAlgError:
+            payments[D] = np.linalg.lstsq(system, rhs, rcond=None)[0]
+        payments[~D] = Lbar[~D]
+        inflows = Pi.T @ payments
+    residual = float(np.max(np.abs(payments - np.where(default_mask, initial_wealth + inflows, Lbar)), initial=0))
+    return payments, default_mask, inflows, iterations, residual
+
+
+def sparse_clearing_vector(liabilities,
+                           initial_wealth: np.ndarray) -> tuple:
+    """
+    | Sparse version of clearing_vector for a scipy.sparse liability matrix. The relative liabilities stay sparse
+    and the payments of the defaulted banks are solved with a sparse LU decomposition.
+
+    :param liabilities: Sparse matrix with the nominal liabilities of bank i (row) towards bank j (column).
+    :param initial_wealth: Wealth of each bank before the interbank payments.
+    :return: A tuple containing the payment vector, the default mask, the interbank inflows of each bank, the
+        number of iterations and the residual of the fixed point.
+    """
+    from scipy.sparse import diags, identity
+    from scipy.sparse.linalg import splu, lsqr
+
+    num_banks = len(initial_wealth)
+    liabilities = liabilities.tocsr()
+    Lbar = np.asarray(liabilities.sum(axis=1)).ravel()
+    scale = np.divide(1, Lbar, out=np.zeros(num_banks), where=Lbar > 0)
+    Pi = (diags(scale) @ liabilities).tocsr()
+    Pi_T = Pi.T.tocsr()
+    payments = Lbar.astype(float)
+    default_mask = np.zeros(num_banks, dtype=bool)
+    iterations = 0
+    inflows = Pi_T @ payments
+    while iterations < max(num_banks, 1):
+        iterations += 1
+        new_default_mask = default_mask | (initial_wealth + inflows - Lbar < 0)
+        if iterations > 1 and np.array_equal(new_default_mask, default_mask):
+            break
+        default_mask = new_default_mask
+        if not default_mask.any():
+            break
+        D = np.flatnonzero(default_mask)
+        ND = np.flatnonzero(~default_mask)
+        system = (identity(D.size, format='csc') - Pi[D][:, D].T).tocsc()
+        rhs = initial_wealth[D] + Pi[ND][:, D].T @ Lbar[ND]
+        try:
+            payments[D] = splu(system).solve(rhs)
+        except RuntimeError:
+            payments[D] = lsqr(system, rhs)[0]
+        payments[ND] = Lbar[ND]
+        inflows = Pi_T @ payments
+    residual = float(np.max(np.abs(payments - np.where(default_mask, initial_wealth + inflows, Lbar)), initial=0))
+    return payments, default_mask, inflows, iterations, residual
+
+
+def batched_clearing_vector(liabilities: np.ndarray,
+                            initial_wealth: np.ndarray) -> tuple:
+    """
+    | Batched version of clearing_vector for many clearing problems on the same banks, e.g. the scenarios of a
+    stress test. The fictitious default algorithm runs for all problems in lockstep. In every iteration the
+    payments of all problems whose default set grew are solved with one stacked np.linalg.solve of the full
+    system p = where(default, wealth + Pi^T p, Lbar), which gives the same payments as solving for the defaulted
+    banks only.
+
+    :param liabilities: Array of shape (scenarios, banks, banks) with the nominal liabilities of bank i (row)
+        towards bank j (column) in every scenario.
+    :param initial_wealth: Array of shape (scenarios, banks) with the wealth of each bank before the interbank
+        payments in every scenario.
+    :return: A tuple containing the payment vectors, the default masks, the interbank inflows, the number of
+        iterations and the residuals of the fixed points, one row or entry per scenario.
+    """
+    num_scenarios, num_banks = initial_wealth.shape
+    Lbar = np.sum(liabilities, axis=2)
+    Pi = np.divide(liabilities, Lbar[:, :, None], out=np.zeros_like(liabilities, dtype=float),
+                   where=Lbar[:, :, None] > 0)
+    Pi_T = np.swapaxes(Pi, 1, 2)
+    payments = Lbar.astype(float)
+    default_mask = np.zeros((num_scenarios, num_banks), dtype=bool)
+    iterations = np.zeros(num_scenarios, dtype=int)
+    inflows = np.einsum('sij,si->sj', Pi, payments)
+    active = np.ones(num_scenarios, dtype=bool)
+    identity = np.eye(num_banks)
+    for _ in range(max(num_banks, 1)):
+        iterations[active] += 1
+        new_default_mask = default_mask | (initial_wealth + inflows - Lbar < 0)
+        # a problem is done once its default set stops growing, or if no bank defaults in the first iteration
+        active &= np.any(new_default_mask != default_mask, axis=1)
+        if not active.any():
+            break
+        default_mask[active] = new_default_mask[active]
+        scenarios = np.flatnonzero(active)
+        D = default_mask[scenarios]
+        system = identity - D[:, :, None] * Pi_T[scenarios]
+        rhs = np.where(D, initial_wealth[scenarios], Lbar[scenarios])
+        try:
+            payments[scenarios] = np.linalg.solve(system, rhs[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            payments[scenarios] = [np.linalg.lstsq(A, b, rcond=None)[0] for A, b in zip(system, rhs)]
+        inflows[scenarios] = np.einsum('sij,si->sj', Pi[scenarios], payments[scenarios])
+    residual = np.max(np.abs(payments - np.where(default_mask, initial_wealth + inflows, Lbar)), axis=1, initial=0)
+    return payments, default_mask, inflows, iterations, residual
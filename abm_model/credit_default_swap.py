@@ -1,3 +1,6 @@
+import numpy as np
+
+
 
 
 class CDS:
@@ -12,7 +15,8 @@ class CDS:
                  notional_amount: float,
                  spread: float,
                  tenor: float=1,
-                 risk_free_rate: float=0):
+                 risk_free_rate: float=0,
+                 reference_rate: float=None):
         """
         | Constructor method that initializes the CDS object with the specific parameters.
 
@@ -24,6 +28,7 @@ class CDS:
         :param spread: The spread of the CDS.
         :param tenor: The tenor of the CDS. Default is 1.
         :param risk_free_rate: The risk-free rate. Default is 0.
+        :param reference_rate: The interest rate of the underlying loan, used to reprice the CDS. Default is None.
         """
         self.buyer = buyer
         self.seller = seller
@@ -33,6 +38,7 @@ class CDS:
         self.spread = spread
         self.tenor = tenor
         self.risk_free_rate = risk_free_rate
+        self.reference_rate = reference_rate
 
     def update_spread(self, spread):
         """
@@ -41,3 +47,47 @@ class CDS:
         :param spread: The new spread value.
         """
         self.spread = spread
+
+
+def hull_cds_spread(default_probability,
+                    interest_rate,
+                    perturbation,
+                    policy_rate: float,
+                    recovery_rate=0.3) -> np.ndarray:
+    """
+    | CDS spreads of the one-period Hull CDS valuation model for arrays of quotes. The default probability seen by
+    the seller is the default probability of the borrower plus the perturbation of the seller, floored at 1%. All
+    arguments are broadcast against each other, so e.g. a column of recovery rates reprices a row of CDS under
+    several recovery assumptions at once.
+
+    :param default_probability: Default probability of the borrower of the underlying loan.
+    :param interest_rate: Interest rate of the underlying loan.
+    :param perturbation: Perturbation of the default probability by the seller, 0 for the plain Hull spread.
+    :param policy_rate: The policy rate, used to discount the payments.
+    :param recovery_rate: Recovery rate of the underlying loan. Default is 0.3.
+    :return: Array of CDS spreads.
+    """
+    default_probability = np.asarray(default_probability, dtype=float)
+    q = default_probability + np.maximum(perturbation, 10 ** (-2) - default_probability)
+    u = 1 / (1 + policy_rate)
+    R = np.asarray(recovery_rate, dtype=float)
+    A = np.asarray(interest_rate, dtype=float)
+    return (1 - R - A * R) * q * u / (q * (u + u) + (1 - q) * u)
+
+
+def reprice_cds_book(cds_book: list,
+                     policy_rate: float,
+                     recovery_rates=0.3) -> np.ndarray:
+    """
+    | Reprice a book of CDS with the Hull model under alternative recovery assumptions, without the perturbation
+    of the sellers. The CDS must carry the interest rate of their underlying loan.
+
+    :param cds_book: List of CDS objects.
+    :param policy_rate: The policy rate.
+    :param recovery_rates: A single recovery rate or a list of recovery rates.
+    :return: Array of spreads with one row per recovery rate (a single row for a single rate) and one column per CDS.
+    """
+    default_probability = np.array([cds.default_probability for cds in cds_book], dtype=float)
+    interest_rate = np.array([cds.reference_rate for cds in cds_book], dtype=float)
+    recovery_rates = np.atleast_1d(np.asarray(recovery_rates, dtype=float))[:, None]
+    return hull_cds_spread(default_probability, interest_rate, 0, policy_rate, recovery_rates)
@@ -0,0 +1,79 @@
+from concurrent.futures import ProcessPoolExecutor
+from abm_model.simulation import Simulation, SimulationConfig
+from abm_model.historic_data import HistoricData
+import numpy as np
+import os
+
+
+def spawn_seeds(seed, runs: int) -> list:
+    """
+    | Spawn independent seed sequences for the members of an ensemble.
+
+    :param seed: Root seed of the ensemble, either an integer, a numpy.random.SeedSequence or None.
+    :param runs: Number of seed sequences to spawn.
+    :return: List of numpy.random.SeedSequence objects.
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return root.spawn(runs)
+
+
+def member_config(config: SimulationConfig,
+                  *names: str) -> SimulationConfig:
+    """
+    | Configuration of one run of an ensemble. Every streamed event log needs a directory of its own, so if the
+    configuration streams the log to log_dir, the run gets the subdirectory of log_dir given by names.
+
+    :param config: Configuration shared by the runs.
+    :param names: Path of the subdirectory of the run, relative to log_dir.
+    :return: The configuration of the run.
+    """
+    if config.log_dir is None:
+        return config
+    return SimulationConfig(**dict(config.to_dict(), log_dir=os.path.join(config.log_dir, *names)))
+
+
+def run_simulation(config: SimulationConfig,
+                   seed,
+                   T: int) -> HistoricData:
+    """
+    | Run a single simulation. Module level function such that it can be sent to worker processes.
+
+    :param config: Configuration of the run.
+    :param seed: Seed of the run, either an integer or a numpy.random.SeedSequence.
+    :param T: Number of periods to simulate.
+    :return: The historic data of the run.
+    """
+    return Simulation(config, seed=seed).run(T)
+
+
+def run_ensemble(config: SimulationConfig,
+                 runs: int,
+                 T: int,
+                 seed=None,
+                 max_workers: int = None,
+                 lockstep: bool = False) -> list[HistoricData]:
+    """
+    | Run an ensemble of independent simulations of the same configuration across a pool of worker processes.
+    Every run receives its own random stream spawned from the root seed, so the ensemble is reproducible
+    and independent of the number of workers. With lockstep the runs are advanced together in a single
+    LockstepEnsemble instead, which is much faster for many runs of small economies. If the event log is streamed
+    to disk, run i writes it to the subdirectory run_i of log_dir.
+
+    :param config: Configuration shared by all runs.
+    :param runs: Number of runs in the ensemble.
+    :param T: Number of periods to simulate per run.
+    :param seed: Root seed of the ensemble, either an integer, a numpy.random.SeedSequence or None.
+    :param max_workers: Number of worker processes. Defaults to the number of cores; 1 runs in-process.
+    :param lockstep: Run the ensemble as a LockstepEnsemble in-process. The engine of the configuration is ignored.
+    :return: List with the historic data of each run, in the order of the spawned seeds.
+    """
+    if lockstep:
+        from abm_model.lockstep import LockstepEnsemble
+        root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        return LockstepEnsemble(config, runs, seed=root).run(T)
+    seeds = spawn_seeds(seed, runs)
+    configs = [member_config(config, f'run_{i}') for i in range(runs)]
+    if max_workers == 1:
+        return [run_simulation(run_config, run_seed, T) for run_config, run_seed in zip(configs, seeds)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run_simulation, configs, seeds, [T] * runs))
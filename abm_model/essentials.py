@@ -21,31 +21,34 @@ def merge_dict(list_dict: list[dict]) -> dict:
     return dict(out_dict)
 
 
-def wages_adj() -> float:
+def wages_adj(rng: np.random.Generator) -> float:
     """
     | Helper function to generate randomness in adjusting the firm wage.
 
+    :param rng: Random number generator.
     :return: Random number.
     """
-    return np.random.uniform(-max_increase_wages, max_increase_wages, 1)[0]
+    return rng.uniform(-max_increase_wages, max_increase_wages, 1)[0]
 
 
-def price_adj() -> float:
+def price_adj(rng: np.random.Generator) -> float:
     """
     | Helper function to generate randomness in adjusting the firm price.
 
+    :param rng: Random number generator.
     :return: Random number.
     """
-    return np.random.uniform(0, max_increase_prices, 1)[0]
+    return rng.uniform(0, max_increase_prices, 1)[0]
 
 
-def supply_adj() -> float:
+def supply_adj(rng: np.random.Generator) -> float:
     """
     | Helper function to generate randomness in adjusting the firm supply.
 
+    :param rng: Random number generator.
     :return: Random number.
     """
-    return np.random.uniform(0, max_increase_quantity, 1)[0]
+    return rng.uniform(0, max_increase_quantity, 1)[0]
 
 
 def compute_expected_supply_price(excess_supply: float,
@@ -53,7 +56,8 @@ def compute_expected_supply_price(excess_supply: float,
                                   prev_price: float,
                                   market_price: float,
                                   wage: float,
-                                  productivity: float) -> tuple:
+                                  productivity: float,
+                                  rng: np.random.Generator) -> tuple:
     """
     | Compute expected supply and price based on the book Macroeconomics from Bottom-up by Gatti et al. (2011)  page 55.
 
@@ -63,6 +67,7 @@ def compute_expected_supply_price(excess_supply: float,
     :param market_price: Previous period market price.
     :param wage: Current wage.
     :param productivity: Current firm productivity.
+    :param rng: Random number generator.
     :return: price and supply for current period.
     """
     statement_1 = (excess_supply > 0 and prev_price >= market_price)
@@ -71,8 +76,44 @@ def compute_expected_supply_price(excess_supply: float,
     statement_4 = (excess_supply == 0 and prev_price >= market_price)
     if statement_1 or statement_2:  # price adjustments
         supply = prev_supply
-        price = max([prev_price * (1 + price_adj() * [-1 if statement_1 else 1][0]), wage/productivity])
+        price = max([prev_price * (1 + price_adj(rng) * [-1 if statement_1 else 1][0]), wage/productivity])
     else:
         price = prev_price
-        supply = prev_supply * (1 + supply_adj() * [-1 if statement_3 else 1][0])
+        supply = prev_supply * (1 + supply_adj(rng) * [-1 if statement_3 else 1][0])
+    return price, supply
+
+
+def compute_expected_supply_price_array(excess_supply: np.ndarray,
+                                        prev_supply: np.ndarray,
+                                        prev_price: np.ndarray,
+                                        market_price: float,
+                                        wage: np.ndarray,
+                                        productivity: np.ndarray,
+                                        rng: np.random.Generator) -> tuple:
+    """
+    | Vectorized version of compute_expected_supply_price for a whole population of firms. One uniform is drawn
+    per firm and scales either the price or the supply adjustment, so the number of draws does not depend on the
+    state of the firms and the stream stays aligned across scenarios with common random numbers.
+
+    :param excess_supply: Previous period excess supply of each firm.
+    :param prev_supply: Previous period supply of each firm.
+    :param prev_price: Previous period price of each firm.
+    :param market_price: Previous period market price.
+    :param wage: Current wage of each firm.
+    :param productivity: Current productivity of each firm.
+    :param rng: Random number generator.
+    :return: price and supply arrays for current period.
+    """
+    statement_1 = (excess_supply > 0) & (prev_price >= market_price)
+    statement_2 = (excess_supply == 0) & (prev_price < market_price)
+    statement_3 = (excess_supply > 0) & (prev_price < market_price)
+    price_adjustment = statement_1 | statement_2
+    adjustment = rng.uniform(0, 1, np.shape(prev_price))
+    price = np.where(price_adjustment,
+                     np.maximum(prev_price * (1 + max_increase_prices * adjustment * np.where(statement_1, -1, 1)),
+                                wage / productivity),
+                     prev_price)
+    supply = np.where(price_adjustment,
+                      prev_supply,
+                      prev_supply * (1 + max_increase_quantity * adjustment * np.where(statement_3, -1, 1)))
     return price, supply
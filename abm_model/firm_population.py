@@ -0,0 +1,170 @@
+from abm_model.firms import BaseFirm, Firm
+from abm_model.loan import Loan
+from abm_model.essentials import max_increase_wages, compute_expected_supply_price_array
+from abm_model.population import AgentPopulation, AgentView, install_view_properties
+from abm_model.clear_firm_default import adjust_production, produce_supply_consumption, firm_debt, check_default
+import numpy as np
+
+
+class FirmPopulation(AgentPopulation, BaseFirm):
+    """
+    | Struct-of-arrays representation of all firms. Every firm variable is stored in a contiguous float array
+    and the per-period firm dynamics are computed for all firms at once. Indexing the population with a firm id
+    returns a FirmView, so code written for Firm objects keeps working.
+    """
+    array_fields = ('supply', 'excess_supply', 'price', 'wage', 'equity', 'productivity', 'default_probability',
+                    'total_wages', 'credit_demand', 'financial_fragility', 'recovery_rate', 'prev_equity')
+    agent_fields = ('supply', 'excess_supply', 'price', 'wage', 'equity', 'productivity', 'default_probability')
+    list_fields = ('loans', 'potential_lenders')
+    agent_class = Firm
+
+    def __init__(self,
+                 ids: list,
+                 supply,
+                 excess_supply,
+                 price,
+                 wage,
+                 equity,
+                 productivity,
+                 default_probability):
+        """
+        | Set up the population from the per-firm values, given in the order of the firm ids.
+
+        :param ids: List of unique firm identifiers.
+        :param supply: Supply in the previous period.
+        :param excess_supply: Excess supply in the previous period.
+        :param price: Firm's good price in the previous period.
+        :param wage: The wage the firm pays for the labour.
+        :param equity: Equity of the firm.
+        :param productivity: Productivity of the firm.
+        :param default_probability: Default probability of the firm.
+        """
+        self._init_arrays(ids, {'supply': supply, 'excess_supply': excess_supply, 'price': price, 'wage': wage,
+                                'equity': equity, 'productivity': productivity,
+                                'default_probability': default_probability})
+
+    @staticmethod
+    def empty_list_field(name: str):
+        return [] if name == 'loans' else None
+
+    @classmethod
+    def from_firms(cls, firms: dict):
+        """
+        | Build a population from a dictionary of Firm objects.
+
+        :param firms: Dictionary of Firm objects keyed by firm id.
+        :return: The FirmPopulation.
+        """
+        return cls.from_agents(firms)
+
+    # vectorized firm dynamics
+    def compute_expected_supply_and_prices(self):
+        """
+        | Compute the expected supply and prices for all firms, see Firm.compute_expected_supply_and_prices.
+        """
+        rng = self.streams['firm_adjustments']
+        wage_adjustment = rng.uniform(-max_increase_wages, max_increase_wages, len(self.ids))
+        self.wage = np.maximum(self.min_wage, self.wage * (1 + wage_adjustment))
+        self.price, self.supply = compute_expected_supply_price_array(self.excess_supply,
+                                                                      self.supply,
+                                                                      self.price,
+                                                                      self.market_price,
+                                                                      self.wage,
+                                                                      self.productivity,
+                                                                      rng)
+        # make sure firms do not go beyond max leverage
+        self.supply = np.minimum(self.productivity * (self.max_leverage + 1) * self.equity / self.wage, self.supply)
+        # compute total wages
+        self.total_wages = self.wage * self.supply / self.productivity
+
+    def check_loan_desire_and_choose_loans(self):
+        """
+        | Check which firms have a desire for loans and choose their potential lenders, see
+        Firm.check_loan_desire_and_choose_loans. The lenders of all firms are drawn in one call.
+        """
+        self.credit_demand = np.maximum(self.total_wages - self.equity, 0)
+        self.financial_fragility = self.credit_demand / self.equity
+        borrowers = np.flatnonzero(self.credit_demand > 0)
+        lenders = self.streams['lender_choice'].integers(0, len(self.bank_ids),
+                                                         size=(borrowers.size, self.max_bank_loan))
+        self.potential_lenders = [[] for _ in self.ids]
+        for i, bank_indices in zip(borrowers, lenders):
+            self.potential_lenders[i] = [Loan(lender=self.bank_ids[j],
+                                              borrower=self.ids[i],
+                                              notional_amount=self.credit_demand[i],
+                                              financial_fragility_borrower=self.financial_fragility[i],
+                                              prob_default_borrower=self.default_probability[i])
+                                         for j in bank_indices]
+
+    def adjust_production(self):
+        """
+        | Adjust the production of all firms to the available funds, see clear_firm_default.adjust_production.
+        """
+        adjust_production(self)
+
+    def produce_supply_consumption(self,
+                                   min_consumption: float,
+                                   max_consumption: float,
+                                   overall_consumption: float,
+                                   consumption_std: float):
+        """
+        | Produce the supply and handle consumption for all firms, see clear_firm_default.produce_supply_consumption.
+
+        :param min_consumption: The minimum consumption as a percentage between 0 and 1.
+        :param max_consumption: The maximum consumption as a percentage between 0 and 1.
+        :param overall_consumption: The overall consumption.
+        :param consumption_std: The standard deviation of consumption.
+        """
+        produce_supply_consumption(self, self.streams['consumption'], min_consumption, max_consumption,
+                                   overall_consumption, consumption_std)
+
+    def total_debt(self) -> np.ndarray:
+        """
+        | Compute the outstanding debt, interest included, of every firm, see clear_firm_default.firm_debt.
+
+        :return: Array with the debt of each firm.
+        """
+        return firm_debt(self)
+
+    def check_default(self) -> np.ndarray:
+        """
+        | Check which firms have defaulted, see clear_firm_default.check_default.
+
+        :return: Boolean array that is True for the defaulted firms.
+        """
+        return check_default(self)
+
+    def market_price_estimate(self) -> float:
+        """
+        | Compute the supply weighted average price of all firms.
+
+        :return: The market price.
+        """
+        return float(np.sum(self.price * self.supply) / np.sum(self.supply))
+
+    def pay_dividends(self, dividend_ratio: float):
+        """
+        | Pay out the given fraction of the equity growth of the period as dividend.
+
+        :param dividend_ratio: Fraction of the equity growth paid out.
+        """
+        dividend = np.maximum(self.equity / self.prev_equity - 1, 0)
+        self.equity = self.equity - dividend_ratio * dividend * self.equity
+
+    def reset_variables(self):
+        """
+        | Resets the per-period variables of all firms, see Firm.reset_variables.
+        """
+        for name in ('total_wages', 'credit_demand', 'financial_fragility', 'recovery_rate'):
+            getattr(self, name)[:] = np.nan
+        self.reset_list_fields()
+
+
+class FirmView(AgentView, Firm):
+    """
+    | Firm object view on a single firm of a FirmPopulation.
+    """
+
+
+FirmPopulation.view_class = FirmView
+install_view_properties(FirmPopulation)
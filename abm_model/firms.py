@@ -1,6 +1,6 @@
 from abm_model.loan import Loan
 from abm_model.baseclass import BaseAgent
-import random
+from abm_model.clear_firm_default import adjust_production, produce_supply_consumption, check_default
 from abm_model.essentials import *
 
 
@@ -84,13 +84,14 @@ class Firm(BaseFirm):
         """
         | Compute the expected supply and prices for the firm.
         """
-        self.wage = max([self.min_wage, self.wage * (1 + wages_adj())])
+        self.wage = max([self.min_wage, self.wage * (1 + wages_adj(self.streams['firm_adjustments']))])
         self.price, self.supply = compute_expected_supply_price(self.excess_supply,
                                                                 self.supply,
                                                                 self.price,
                                                                 self.market_price,
                                                                 self.wage,
-                                                                self.productivity)
+                                                                self.productivity,
+                                                                self.streams['firm_adjustments'])
         # make sure firm does not go beyond max leverage
         self.supply = min([self.productivity * (self.max_leverage + 1) * self.equity / self.wage, self.supply])
         # compute total wages
@@ -105,12 +106,13 @@ class Firm(BaseFirm):
         self.financial_fragility = self.credit_demand / self.equity
         if self.credit_demand > 0:
             # pick random banks
+            lenders = self.streams['lender_choice'].integers(0, len(self.bank_ids), size=self.max_bank_loan)
             potential_lenders = [Loan(lender=x,
                                       borrower=self.idx,
                                       notional_amount=self.credit_demand,
                                       financial_fragility_borrower=self.financial_fragility,
                                       prob_default_borrower=self.default_probability,
-                                      ) for x in random.choices(self.bank_ids, k=self.max_bank_loan)
+                                      ) for x in [self.bank_ids[i] for i in lenders]
                                  ]
             self.potential_lenders = potential_lenders
         else:
@@ -118,13 +120,9 @@ class Firm(BaseFirm):
 
     def adjust_production(self):
         """
-        | Adjust the production based on the available funds.
+        | Adjust the production based on the available funds, see clear_firm_default.adjust_production.
         """
-        if self.total_wages != self.equity:
-            # loan has not been paid, so we do not have money for all wages
-            #  we need to reduce supply
-            self.supply = self.equity * self.productivity / self.wage
-            self.total_wages = self.equity
+        adjust_production({self.idx: self})
 
     def produce_supply_consumption(self,
                                    min_consumption: float,
@@ -132,19 +130,16 @@ class Firm(BaseFirm):
                                    overall_consumption: float,
                                    consumption_std: float):
         """
-        | Produce the supply and handle consumption based on certain parameters.
+        | Produce the supply and handle consumption based on certain parameters, see
+        clear_firm_default.produce_supply_consumption.
 
         :param min_consumption: The minimum consumption as a percentage between 0 and 1.
         :param max_consumption: The maximum consumption as a percentage between 0 and 1.
         :param overall_consumption: The overall consumption.
         :param consumption_std: The standard deviation of consumption.
         """
-        self.prev_equity = self.equity
-        self.equity -= self.total_wages
-        actual_consumption_percentage = min(max(min_consumption, np.random.normal(overall_consumption,
-                                                                                  consumption_std)), max_consumption)
-        self.equity += self.price * actual_consumption_percentage * self.supply
-        self.excess_supply = (1 - actual_consumption_percentage) * self.supply
+        produce_supply_consumption({self.idx: self}, self.streams['consumption'], min_consumption, max_consumption,
+                                   overall_consumption, consumption_std)
 
     def reset_variables(self):
         """
@@ -159,11 +154,8 @@ class Firm(BaseFirm):
 
     def check_default(self):
         """
-        | Check if the firm has defaulted.
+        | Check if the firm has defaulted, see clear_firm_default.check_default.
 
         :return: True if the firm has defaulted, False otherwise.
         """
-        if self.equity < sum([(1+loan.interest_rate) * loan.notional_amount for loan in self.loans]):
-            # we have default of the entity
-            return True
-        return False
+        return bool(check_default({self.idx: self})[0])
@@ -0,0 +1,243 @@
+from abm_model.simulation import Simulation, SimulationConfig
+from abm_model.historic_data import HistoricData
+from abm_model.ensemble import run_ensemble
+from abm_model.benchmark import metadata
+import numpy as np
+import argparse
+import json
+import os
+
+# default location of the golden run of the reference implementation
+golden_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'reference.json')
+
+
+def summarize(historic_data: HistoricData) -> dict:
+    """
+    | Summarize a run by the time average of every metric.
+
+    :param historic_data: The historic data of the run.
+    :return: Dictionary of metric name to time average.
+    """
+    return {name: float(np.mean(historic_data[name])) for name in HistoricData.metrics}
+
+
+def record_golden(config: SimulationConfig,
+                  seed: int,
+                  T: int,
+                  runs: int,
+                  max_workers: int = None) -> dict:
+    """
+    | Record a golden run of the object engine: the full time series of one seeded run for exact comparisons and
+    the summaries of an ensemble of runs for distributional comparisons.
+
+    :param config: Configuration of the runs. The engine is set to 'object'.
+    :param seed: Seed of the reference run and root seed of the ensemble.
+    :param T: Number of periods per run.
+    :param runs: Number of runs in the ensemble.
+    :param max_workers: Number of worker processes of the ensemble.
+    :return: The golden run.
+    """
+    config = SimulationConfig(**dict(config.to_dict(), engine='object', verbose=False))
+    reference = Simulation(config, seed=seed).run(T)
+    ensemble = run_ensemble(config, runs, T, seed=seed, max_workers=max_workers)
+    return {'metadata': metadata(),
+            'config': config.to_dict(),
+            'seed': seed,
+            'T': T,
+            'series': {name: reference[name].tolist() for name in HistoricData.metrics},
+            'ensemble': [summarize(historic_data) for historic_data in ensemble]}
+
+
+def save_golden(golden: dict, path: str):
+    """
+    | Save a golden run as JSON. Floats are written with full precision.
+
+    :param golden: The golden run.
+    :param path: Path of the JSON file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(golden, file, indent=1)
+
+
+def load_golden(path: str = golden_path) -> dict:
+    """
+    | Load a golden run.
+
+    :param path: Path of the JSON file.
+    :return: The golden run.
+    """
+    with open(path) as file:
+        golden = json.load(file)
+    # JSON object keys are strings, the economy states are indexed by integers
+    golden['config']['states'] = {int(state): name for state, name in golden['config']['states'].items()}
+    return golden
+
+
+def check_exact(golden: dict,
+                historic_data: HistoricData,
+                rtol: float = 1e-9,
+                atol: float = 1e-12) -> dict:
+    """
+    | Compare the time series of a run with the same seed to the golden run, period by period.
+
+    :param golden: The golden run.
+    :param historic_data: The historic data of the run.
+    :param rtol: Relative tolerance.
+    :param atol: Absolute tolerance.
+    :return: Dictionary of metric name to a dictionary with the maximum relative deviation, the first period that
+        deviates (None if none) and whether the metric passed.
+    """
+    report = {}
+    for name, expected in golden['series'].items():
+        expected = np.array(expected, dtype=float)
+        actual = np.asarray(historic_data[name], dtype=float)[:len(expected)]
+        deviation = np.abs(actual - expected)
+        failed = np.flatnonzero(~(deviation <= atol + rtol * np.abs(expected))) if len(actual) == len(expected) \
+            else np.array([min(len(actual), len(expected))])
+        report[name] = {'max_deviation': float(np.max(deviation / np.maximum(np.abs(expected), atol), initial=0)),
+                        'first_period': int(failed[0]) if failed.size > 0 else None,
+                        'passed': failed.size == 0}
+    return report
+
+
+def ks_statistic(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    | Two-sample Kolmogorov-Smirnov statistic, the largest distance between the empirical distribution functions.
+
+    :param a: First sample.
+    :param b: Second sample.
+    :return: The statistic.
+    """
+    a, b = np.sort(a), np.sort(b)
+    values = np.concatenate([a, b])
+    cdf_a = np.searchsorted(a, values, side='right') / len(a)
+    cdf_b = np.searchsorted(b, values, side='right') / len(b)
+    return float(np.max(np.abs(cdf_a - cdf_b)))
+
+
+def ks_critical_value(n: int, m: int, alpha: float) -> float:
+    """
+    | Asymptotic critical value of the two-sample Kolmogorov-Smirnov test.
+
+    :param n: Size of the first sample.
+    :param m: Size of the second sample.
+    :param alpha: Significance level.
+    :return: The critical value.
+    """
+    return float(np.sqrt(-np.log(alpha / 2) / 2) * np.sqrt((n + m) / (n * m)))
+
+
+def check_distribution(golden: dict,
+                       summaries: list,
+                       alpha: float = 0.01) -> dict:
+    """
+    | Compare the summaries of an ensemble of runs to the ensemble of the golden run with a two-sample
+    Kolmogorov-Smirnov test per metric.
+
+    :param golden: The golden run.
+    :param summaries: List of run summaries, see summarize.
+    :param alpha: Significance level of the tests.
+    :return: Dictionary of metric name to a dictionary with the golden and the candidate mean, the statistic, the
+        critical value and whether the metric passed.
+    """
+    report = {}
+    for name in HistoricData.metrics:
+        expected = np.array([summary[name] for summary in golden['ensemble']])
+        actual = np.array([summary[name] for summary in summaries])
+        statistic = ks_statistic(expected, actual)
+        critical_value = ks_critical_value(len(expected), len(actual), alpha)
+        report[name] = {'golden_mean': float(np.mean(expected)),
+                        'mean': float(np.mean(actual)),
+                        'statistic': statistic,
+                        'critical_value': critical_value,
+                        'passed': statistic <= critical_value}
+    return report
+
+
+def check_engine(golden: dict,
+                 engine: str,
+                 exact: bool = None,
+                 seed: int = None,
+                 alpha: float = 0.01,
+                 rtol: float = 1e-9,
+                 max_workers: int = None,
+                 runs: int = None) -> dict:
+    """
+    | Check an engine against the golden run, exactly with the seed of the golden run and distributionally with an
+    ensemble of runs.
+
+    :param golden: The golden run.
+    :param engine: Engine to check, see SimulationConfig, or 'lockstep' for the LockstepEnsemble.
+    :param exact: Do the exact check. By default only done for the object engine, since other engines draw their
+        random numbers in a different order. Not possible for the lockstep ensemble.
+    :param seed: Root seed of the ensemble, the seed of the golden run if None.
+    :param alpha: Significance level of the distributional tests.
+    :param rtol: Relative tolerance of the exact check.
+    :param max_workers: Number of worker processes of the ensemble.
+    :param runs: Number of runs of the ensemble, the size of the golden ensemble if None.
+    :return: Dictionary with the exact and the distributional report and whether all checks passed.
+    """
+    lockstep = engine == 'lockstep'
+    config = SimulationConfig(**dict(golden['config'], engine='object' if lockstep else engine))
+    report = {'engine': engine}
+    if exact is None:
+        exact = engine == 'object'
+    if exact and not lockstep:
+        report['exact'] = check_exact(golden, Simulation(config, seed=golden['seed']).run(golden['T']), rtol=rtol)
+    ensemble = run_ensemble(config, len(golden['ensemble']) if runs is None else runs, golden['T'],
+                            seed=golden['seed'] if seed is None else seed, max_workers=max_workers,
+                            lockstep=lockstep)
+    report['distribution'] = check_distribution(golden, [summarize(historic_data) for historic_data in ensemble],
+                                                alpha=alpha)
+    report['passed'] = all(result['passed'] for check in ('exact', 'distribution') if check in report
+                           for result in report[check].values())
+    return report
+
+
+def main(argv: list = None):
+    """
+    | Command line interface to record a golden run and to check engines against it.
+
+    :param argv: Command line arguments, sys.argv is used if None.
+    """
+    parser = argparse.ArgumentParser(description='Record a golden run of the reference implementation and check '
+                                                 'engines against it.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record = subparsers.add_parser('record', help='record a golden run with the object engine')
+    record.add_argument('--output', default=golden_path, help='path of the golden run')
+    record.add_argument('--firms', type=int, default=300, help='number of firms')
+    record.add_argument('--banks', type=int, default=20, help='number of banks')
+    record.add_argument('--seed', type=int, default=2, help='seed of the reference run and the ensemble')
+    record.add_argument('--T', type=int, default=50, help='number of periods per run')
+    record.add_argument('--runs', type=int, default=200, help='number of runs in the ensemble')
+    record.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    check = subparsers.add_parser('check', help='check an engine against a golden run')
+    check.add_argument('--golden', default=golden_path, help='path of the golden run')
+    check.add_argument('--engine', default='object', choices=['object', 'array', 'lockstep'],
+                       help='engine to check')
+    check.add_argument('--seed', type=int, default=None, help='root seed of the ensemble')
+    check.add_argument('--alpha', type=float, default=0.01, help='significance level of the distribution tests')
+    check.add_argument('--rtol', type=float, default=1e-9, help='relative tolerance of the exact check')
+    check.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    check.add_argument('--runs', type=int, default=None,
+                       help='number of runs in the ensemble, the size of the golden ensemble by default')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        golden = record_golden(SimulationConfig(firms=args.firms, banks=args.banks), args.seed, args.T, args.runs,
+                               max_workers=args.workers)
+        save_golden(golden, args.output)
+        return
+    report = check_engine(load_golden(args.golden), args.engine, seed=args.seed, alpha=args.alpha,
+                          rtol=args.rtol, max_workers=args.workers, runs=args.runs)
+    for name, result in report.get('exact', {}).items():
+        print(f"exact        {name:<22}{result['max_deviation']:>12.2e}  {'ok' if result['passed'] else 'FAILED'}")
+    for name, result in report['distribution'].items():
+        print(f"distribution {name:<22}{result['statistic']:>12.3f}  {'ok' if result['passed'] else 'FAILED'}")
+    if not report['passed']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class GroupedIndex:
+    """
+    | Compressed sparse row (CSR) style grouping of items by an integer key. The items are sorted once by key and,
+    within a key, by an optional ordering value with a stable np.lexsort, and the groups are stored as offsets into
+    that order. Ties in the ordering value keep the original order of the items.
+    """
+    def __init__(self,
+                 keys,
+                 num_groups: int = None,
+                 order_by=None):
+        """
+        | Group items by key.
+
+        :param keys: Integer key of every item, between 0 and num_groups - 1.
+        :param num_groups: Number of groups. One more than the largest key if None.
+        :param order_by: Optional value of every item by which the items of a group are ordered.
+        """
+        keys = np.asarray(keys, dtype=int)
+        self.num_groups = int(keys.max(initial=-1)) + 1 if num_groups is None else num_groups
+        if order_by is None:
+            self.order = np.argsort(keys, kind='stable')
+        else:
+            self.order = np.lexsort((np.asarray(order_by, dtype=float), keys))
+        self.offsets = np.zeros(self.num_groups + 1, dtype=int)
+        np.cumsum(np.bincount(keys, minlength=self.num_groups), out=self.offsets[1:])
+
+    def group(self, key: int) -> np.ndarray:
+        """
+        | Items of a group.
+
+        :param key: The key of the group.
+        :return: Array with the positions of the items of the group, in order.
+        """
+        return self.order[self.offsets[key]:self.offsets[key + 1]]
+
+    def sizes(self) -> np.ndarray:
+        """
+        | Number of items of every group.
+
+        :return: Array with the size of each group.
+        """
+        return np.diff(self.offsets)
+
+    def first(self) -> np.ndarray:
+        """
+        | First item of every non-empty group, e.g. the offer with the lowest rate.
+
+        :return: Array with the position of the first item of each non-empty group, in the order of the keys.
+        """
+        return self.order[self.offsets[:-1][self.sizes() > 0]]
+
+    def __len__(self):
+        return self.num_groups
+
+
+def first_appearance_codes(codes) -> tuple:
+    """
+    | Renumber integer codes in the order of their first appearance, so that groups can be visited in the order
+    in which they first occur, like the keys of a dictionary filled item by item.
+
+    :param codes: Integer code of every item.
+    :return: A tuple containing the new code of every item and, for every new code, the original code.
+    """
+    unique, first_index, inverse = np.unique(np.asarray(codes, dtype=int), return_index=True, return_inverse=True)
+    appearance = np.argsort(first_index, kind='stable')
+    rank = np.empty_like(appearance)
+    rank[appearance] = np.arange(len(appearance))
+    return rank[inverse.ravel()], unique[appearance]
+
+
+def group_loans(loans: list,
+                keys: list,
+                key_attribute: str) -> dict:
+    """
+    | Group loans by lender or borrower and order every group by interest rate.
+
+    :param loans: List of Loan objects.
+    :param keys: List of the agent ids that are used as keys. Keys without loans are left out.
+    :param key_attribute: 'lender' or 'borrower'.
+    :return: Dictionary that has as keys the agent ids, in the order of their first appearance in the loans, and
+        as values the loans sorted by interest rate.
+    """
+    if len(loans) == 0:
+        return {}
+    positions = {key: i for i, key in enumerate(keys)}
+    codes, groups = first_appearance_codes([positions[getattr(loan, key_attribute)] for loan in loans])
+    grouped = GroupedIndex(codes, len(groups), order_by=[loan.interest_rate for loan in loans])
+    return {keys[group]: [loans[i] for i in grouped.group(code)] for code, group in enumerate(groups)}
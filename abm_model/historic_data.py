@@ -0,0 +1,178 @@
+from abm_model.registry import AgentRegistry
+import numpy as np
+
+
+class HistoricData:
+    """
+    | Preallocated time series store of a simulation. The aggregate metrics are kept in a T x metrics array and
+    the equity of every bank in a T x bank-slot matrix, where the columns are the slots of the bank registry.
+    Both arrays grow by doubling if more periods are recorded than were reserved. Indexing the store with a metric
+    name returns the time series of that metric, and to_dict returns the dictionary of lists used by the plotting
+    code, so the store can be used in place of the former historic data dictionary.
+    """
+    metrics = ('market_price', 'average_wage', 'bank_defaults', 'firm_defaults', 'average_firmloan_ir',
+               'average_bankloan_ir', 'average_cds_spread', 'total_firmloan', 'total_bankloan', 'total_cds_notional',
+               'bank_equity', 'bank_deposits', 'firm_equity', 'firm_market_power')
+    # metrics that count agents and are returned as integers
+    count_metrics = ('bank_defaults', 'firm_defaults')
+
+    def __init__(self, periods: int = 16, bank_slots: int = 0):
+        """
+        | Allocate an empty store.
+
+        :param periods: Number of periods for which memory is allocated.
+        :param bank_slots: Number of bank slots for which memory is allocated.
+        """
+        self.size = 0
+        self.values = np.full((periods, len(self.metrics)), np.nan)
+        self.bank_equity_matrix = np.full((periods, bank_slots), np.nan)
+        # bank id of every slot per period, shared between periods in which no bank was replaced
+        self.bank_slot_ids = []
+        self.columns = {name: j for j, name in enumerate(self.metrics)}
+        # columns of the banks if no bank registry is passed to the analytics, slots are never recycled
+        self.bank_columns = AgentRegistry('bank')
+
+    def reserve(self, periods: int, bank_slots: int = 0):
+        """
+        | Make sure memory is allocated for the given number of periods and bank slots.
+
+        :param periods: Total number of periods.
+        :param bank_slots: Total number of bank slots.
+        """
+        rows, slots = self.bank_equity_matrix.shape
+        if periods > rows:
+            self.values = np.concatenate([self.values, np.full((periods - rows, len(self.metrics)), np.nan)])
+            self.bank_equity_matrix = np.concatenate([self.bank_equity_matrix,
+                                                      np.full((periods - rows, slots), np.nan)])
+        rows = self.bank_equity_matrix.shape[0]
+        if bank_slots > slots:
+            self.bank_equity_matrix = np.concatenate([self.bank_equity_matrix,
+                                                      np.full((rows, bank_slots - slots), np.nan)], axis=1)
+
+    def record(self,
+               t: int,
+               metrics: dict,
+               bank_slots: np.ndarray,
+               bank_equity: np.ndarray,
+               slot_ids: list):
+        """
+        | Store the values of a period.
+
+        :param t: The period, equal to the number of recorded periods.
+        :param metrics: Dictionary of metric name to value.
+        :param bank_slots: Slots of the banks.
+        :param bank_equity: Equity of the banks, in the order of bank_slots.
+        :param slot_ids: Bank id of every slot.
+        """
+        rows, slots = self.bank_equity_matrix.shape
+        self.reserve(2 * rows if t >= rows else rows, max(len(slot_ids), slots))
+        for name, value in metrics.items():
+            self.values[t, self.columns[name]] = value
+        self.bank_equity_matrix[t, bank_slots] = bank_equity
+        slot_ids = tuple(slot_ids)
+        if len(self.bank_slot_ids) > 0 and self.bank_slot_ids[-1] == slot_ids:
+            slot_ids = self.bank_slot_ids[-1]
+        self.bank_slot_ids.append(slot_ids)
+        self.size = t + 1
+
+    def series(self, name: str) -> np.ndarray:
+        """
+        | Time series of a metric over the recorded periods.
+
+        :param name: Name of the metric.
+        :return: Array with one value per period.
+        """
+        values = self.values[:self.size, self.columns[name]]
+        return values.astype(int) if name in self.count_metrics else values
+
+    def banks_equity(self) -> dict:
+        """
+        | Equity of every bank per period in the shape {t: {bank_id: equity}}.
+
+        :return: The dictionary of bank equity.
+        """
+        return {t: {bank_id: float(self.bank_equity_matrix[t, slot])
+                    for slot, bank_id in enumerate(self.bank_slot_ids[t])
+                    if bank_id is not None and not np.isnan(self.bank_equity_matrix[t, slot])}
+                for t in range(self.size)}
+
+    def to_dict(self) -> dict:
+        """
+        | Return the data in the shape of the former historic data dictionary, with a list per metric.
+
+        :return: The historic data dictionary.
+        """
+        historic_data = {'banks_equity': self.banks_equity()}
+        historic_data.update({name: self.series(name).tolist() for name in self.metrics})
+        return historic_data
+
+    def save(self, path: str):
+        """
+        | Save the store to a compressed numpy file, e.g. to render the reports offline.
+
+        :param path: Path of the .npz file.
+        """
+        slots = self.bank_equity_matrix.shape[1]
+        slot_ids = np.array([[bank_id or '' for bank_id in ids] + [''] * (slots - len(ids))
+                             for ids in self.bank_slot_ids], dtype=str).reshape(self.size, slots)
+        np.savez_compressed(path, metrics=np.array(self.metrics), values=self.values[:self.size],
+                            bank_equity_matrix=self.bank_equity_matrix[:self.size], bank_slot_ids=slot_ids)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        | Load a store saved with save.
+
+        :param path: Path of the .npz file.
+        :return: The HistoricData store.
+        """
+        with np.load(path) as data:
+            size, slots = data['bank_equity_matrix'].shape
+            historic_data = cls(periods=max(size, 1), bank_slots=slots)
+            columns = [historic_data.columns[str(name)] for name in data['metrics']]
+            historic_data.values[:size, columns] = data['values']
+            historic_data.bank_equity_matrix[:size] = data['bank_equity_matrix']
+            historic_data.bank_slot_ids = [tuple(str(bank_id) or None for bank_id in ids)
+                                           for ids in data['bank_slot_ids']]
+        historic_data.size = size
+        return historic_data
+
+    @classmethod
+    def from_arrays(cls,
+                    values: np.ndarray,
+                    bank_equity_matrix: np.ndarray,
+                    bank_slot_ids: list):
+        """
+        | Create a store from the arrays of a run that was recorded elsewhere, e.g. one replica of a lockstep
+        ensemble.
+
+        :param values: Array of shape (periods, metrics) in the order of HistoricData.metrics.
+        :param bank_equity_matrix: Array of shape (periods, bank slots) with the equity of the banks.
+        :param bank_slot_ids: Bank id of every slot per period.
+        :return: The HistoricData store.
+        """
+        size, slots = bank_equity_matrix.shape
+        historic_data = cls(periods=max(size, 1), bank_slots=slots)
+        historic_data.values[:size] = values
+        historic_data.bank_equity_matrix[:size] = bank_equity_matrix
+        for slot_ids in bank_slot_ids:
+            slot_ids = tuple(slot_ids)
+            if len(historic_data.bank_slot_ids) > 0 and historic_data.bank_slot_ids[-1] == slot_ids:
+                slot_ids = historic_data.bank_slot_ids[-1]
+            historic_data.bank_slot_ids.append(slot_ids)
+        historic_data.size = size
+        return historic_data
+
+    def keys(self):
+        return ['banks_equity'] + list(self.metrics)
+
+    def __getitem__(self, name: str):
+        if name == 'banks_equity':
+            return self.banks_equity()
+        return self.series(name)
+
+    def __contains__(self, name):
+        return name == 'banks_equity' or name in self.columns
+
+    def __len__(self):
+        return self.size
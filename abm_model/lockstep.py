@@ -0,0 +1,462 @@
+from abm_model.simulation import SimulationConfig
+from abm_model.historic_data import HistoricData
+from abm_model.credit_default_swap import hull_cds_spread
+from abm_model.clear_interbank_market import batched_clearing_vector
+from abm_model.essentials import max_increase_wages, compute_expected_supply_price_array
+from abm_model.initialization import h_theta, min_wage, max_leverage, min_productivity
+from abm_model.random_streams import RNGRegistry
+import numpy as np
+
+
+def masked_mean_std(values: np.ndarray, mask: np.ndarray) -> tuple:
+    """
+    | Mean and (population) standard deviation of every row over the masked entries.
+
+    :param values: Array of shape (replicas, agents).
+    :param mask: Boolean array of the same shape, True for the entries that are used.
+    :return: A tuple containing the mean and the standard deviation of every row, nan for rows without entries.
+    """
+    count = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(mask, values, 0).sum(axis=1) / count
+        std = np.sqrt(np.where(mask, (values - mean[:, None]) ** 2, 0).sum(axis=1) / count)
+    return mean, std
+
+
+def choose_states(probabilities: np.ndarray, uniforms: np.ndarray) -> np.ndarray:
+    """
+    | Draw one state per row from the rows of a probability matrix, see MarkovModel.get_next_state.
+
+    :param probabilities: Array of shape (replicas, states).
+    :param uniforms: One uniform per replica.
+    :return: The drawn state of every replica.
+    """
+    return np.minimum(np.sum(uniforms[:, None] >= np.cumsum(probabilities, axis=1), axis=1),
+                      probabilities.shape[1] - 1)
+
+
+class LockstepEnsemble:
+    """
+    | Ensemble of independent economies of the same configuration that are advanced period by period in
+    lockstep. The state of the firms and banks is stored in replicas x agents arrays and every replica has its own
+    economy state, so the dynamics of all replicas are computed together. The credit market stays sequential in
+    the firms, as the firms choose their loans one after the other, but every step of the firm queue serves the
+    current firm of all replicas at once, and the interbank market of all replicas is cleared with
+    batched_clearing_vector.
+    The dynamics are those of Simulation: every replica is distributed like a run of the object engine. All replicas
+    draw from the separated streams of one RNGRegistry, one stream per model component, so a replica does not
+    reproduce a seeded Simulation run and the results depend on the number of replicas. Event logs, network
+    snapshots and profiling are not supported.
+    """
+    def __init__(self,
+                 config: SimulationConfig = None,
+                 runs: int = 100,
+                 seed=None):
+        """
+        | Generate the initial economies of all replicas, see generate_random_firms_and_banks.
+
+        :param config: Configuration shared by all replicas. The default configuration is used if None.
+        :param runs: Number of replicas.
+        :param seed: Seed of the random streams, the seed of the configuration if None.
+        """
+        self.config = SimulationConfig() if config is None else config
+        config = self.config
+        self.streams = RNGRegistry(config.seed if seed is None else seed, separate=True)
+        rng = self.streams['initialization']
+        self.runs, self.num_firms, self.num_banks = runs, config.firms, config.banks
+        R, F, B = runs, config.firms, config.banks
+        self.t = 0
+        self.market_price = np.full(R, (1 + config.policy_rate) * (min_wage / min_productivity))
+        self.transition_matrix = np.array(config.transition_matrix, dtype=float)
+        self.state_names = list(config.states.keys())
+        self.economy_state = choose_states(np.tile(np.asarray(config.starting_prob, dtype=float), (R, 1)),
+                                           self.streams['economy_state'].random(R))
+        # firms
+        self.firm_equity = np.maximum(1000 * 500 * rng.poisson(4, (R, F)), 500 * 500).astype(float)
+        self.productivity = np.full((R, F), min_productivity)
+        self.excess_supply = (100 * 10 * rng.poisson(4, (R, F))).astype(float)
+        self.supply = np.maximum(400 * 2 * rng.poisson(4, (R, F)), 70 * 2).astype(float)
+        self.wage = min_wage + rng.exponential(4, (R, F))
+        self.default_probability = np.maximum(rng.beta(a=1.9, b=8, size=(R, F)), 0.01)
+        self.price = np.maximum(self.market_price[:, None] + rng.normal(10, 5, (R, F)),
+                                self.wage / self.productivity)
+        self.prev_equity = np.full((R, F), np.nan)
+        # banks
+        self.bank_equity = np.maximum(1000000 / 2, 1000000 * rng.poisson(4, (R, B))).astype(float)
+        self.deposits = self.bank_equity / rng.beta(a=3, b=18, size=(R, B))
+        # number of the bank id of every bank slot, new banks get the next free number of their replica
+        self.bank_numbers = np.tile(np.arange(B), (R, 1))
+        self.next_bank_number = np.full(R, B)
+        # recorded periods
+        self.history = {'values': [], 'bank_equity': [], 'bank_numbers': []}
+
+    def step(self):
+        """
+        | Simulate one period of all replicas, in the phases of Simulation.step.
+        """
+        config = self.config
+        self.compute_expected_supply_and_prices()
+        contracts = self.credit_market()
+        self.market_price = np.sum(self.price * self.supply, axis=1) / np.sum(self.supply, axis=1)
+        self.clear_goods_market()
+        defaulted_firms, recovery_rate, money_from_firm_loans = self.settle_firm_loans(contracts)
+        deposit_change = self.streams['deposit_shocks'].normal(0, config.deposit_shock_std,
+                                                               self.deposits.shape) * self.deposits
+        self.deposits = self.deposits + deposit_change
+        defaulted_banks = self.clear_interbank_market(contracts, defaulted_firms, recovery_rate,
+                                                      money_from_firm_loans, deposit_change)
+        self.record(contracts, defaulted_firms, defaulted_banks)
+        self.regenerate(defaulted_firms, defaulted_banks)
+        self.economy_state = choose_states(self.transition_matrix[self.economy_state],
+                                           self.streams['economy_state'].random(self.runs))
+        self.t += 1
+
+    def run(self, T: int) -> list:
+        """
+        | Simulate T further periods of all replicas.
+
+        :param T: Number of periods to simulate.
+        :return: List with the historic data of each replica.
+        """
+        for _ in range(T):
+            self.step()
+        return self.historic_data()
+
+    def compute_expected_supply_and_prices(self):
+        """
+        | Compute the wages, prices, supply and wage bill of all firms, see Firm.compute_expected_supply_and_prices.
+        """
+        rng = self.streams['firm_adjustments']
+        self.wage = np.maximum(min_wage, self.wage * (1 + rng.uniform(-max_increase_wages, max_increase_wages,
+                                                                      self.wage.shape)))
+        self.price, self.supply = compute_expected_supply_price_array(self.excess_supply,
+                                                                      self.supply,
+                                                                      self.price,
+                                                                      self.market_price[:, None],
+                                                                      self.wage,
+                                                                      self.productivity,
+                                                                      rng)
+        self.supply = np.minimum(self.productivity * (max_leverage + 1) * self.firm_equity / self.wage, self.supply)
+        self.total_wages = self.wage * self.supply / self.productivity
+
+    def credit_market(self) -> dict:
+        """
+        | Price the loan requests of all firms and allocate the loans and CDS, see asses_all_loan_requests and
+        create_network_connections. The firm queues of all replicas are processed in lockstep: in step j the j-th
+        firm of every queue tries its offers from the cheapest on, with an interbank top-up of the lender if
+        needed, and the CDS on all loans extended in the step are traded together.
+
+        :return: Dictionary with the firm loans and interbank loans as replicas x firms arrays (lender -1 for no
+            loan) and the bought CDS as flat arrays.
+        """
+        config, streams = self.config, self.streams
+        R, F, B = self.runs, self.num_firms, self.num_banks
+        k = config.max_bank_loan
+        rows = np.arange(R)
+        credit_demand = np.maximum(self.total_wages - self.firm_equity, 0)
+        fragility = credit_demand / self.firm_equity
+        # loan requests to max_bank_loan random banks, priced like BaseBank.price_loan_requests
+        self.max_credit = self.deposits / config.capital_req
+        lenders = streams['lender_choice'].integers(0, B, size=(R, F, k))
+        uniforms = streams['loan_pricing'].random((R, F, k, 2))
+        delta = 0.9 + (1.1 - 0.9) * uniforms[..., 1]
+        rates = config.policy_rate * (1 + h_theta * uniforms[..., 0] *
+                                      np.tanh((1 + delta * self.default_probability[..., None]) * fragility[..., None]))
+        valid = (credit_demand[..., None] > 0) & ~(credit_demand[..., None] > self.max_credit[rows[:, None, None],
+                                                                                           lenders])
+        # offers of every firm by increasing rate, rejected requests last
+        order = np.argsort(np.where(valid, rates, np.inf), axis=2, kind='stable')
+        lenders, rates, valid = (np.take_along_axis(values, order, axis=2) for values in (lenders, rates, valid))
+
+        self.loan_assets = np.zeros((R, B))
+        self.loan_liabilities = np.zeros((R, B))
+        self.cds_premium = np.zeros((R, B))
+        self.current_deposits = self.deposits.copy()
+        contracts = {'lender': np.full((R, F), -1), 'amount': np.zeros((R, F)), 'rate': np.zeros((R, F)),
+                     'interbank_lender': np.full((R, F), -1), 'interbank_amount': np.zeros((R, F)),
+                     'interbank_rate': np.zeros((R, F)), 'cds': []}
+        queue = np.argsort(streams['loan_queue'].random((R, F)), axis=1)
+        trade_cds = config.covered_cds_prob > 0 or config.naked_cds_prob > 0
+        for j in range(F):
+            firm = queue[:, j]
+            pending = credit_demand[rows, firm] > 0
+            served = np.zeros(R, dtype=bool)
+            for o in range(k):
+                r = np.flatnonzero(pending & valid[rows, firm, o])
+                if r.size == 0:
+                    break
+                f, lender, amount = firm[r], lenders[r, firm[r], o], credit_demand[r, firm[r]]
+                assets = self.loan_assets[r, lender]
+                condition = self.deposits[r, lender] + self.loan_liabilities[r, lender] - (amount + assets)
+                # see MatchingEngine.match: skip lenders above their maximum credit or without funds left
+                granted = (amount + assets <= self.max_credit[r, lender]) & (condition != 0)
+                top_up = np.flatnonzero(granted & (condition < 0))
+                if top_up.size > 0:
+                    found, interbank_lender, interbank_rate = self.find_interbank_loans(r[top_up], lender[top_up],
+                                                                                        -condition[top_up],
+                                                                                        amount[top_up])
+                    granted[top_up] = found
+                    top_up, interbank_lender, interbank_rate = (top_up[found], interbank_lender[found],
+                                                                interbank_rate[found])
+                    ib_rows, ib_amount = r[top_up], -condition[top_up]
+                    self.current_deposits[ib_rows, interbank_lender] -= ib_amount
+                    self.loan_assets[ib_rows, interbank_lender] += ib_amount
+                    self.loan_liabilities[ib_rows, lender[top_up]] += ib_amount
+                    contracts['interbank_lender'][ib_rows, f[top_up]] = interbank_lender
+                    contracts['interbank_amount'][ib_rows, f[top_up]] = ib_amount
+                    contracts['interbank_rate'][ib_rows, f[top_up]] = interbank_rate
+                r, f, lender, amount = r[granted], f[granted], lender[granted], amount[granted]
+                self.loan_assets[r, lender] += amount
+                self.current_deposits[r, lender] -= amount
+                contracts['lender'][r, f] = lender
+                contracts['amount'][r, f] = amount
+                contracts['rate'][r, f] = rates[r, f, o]
+                pending[r] = False
+                served[r] = True
+            if trade_cds and served.any():
+                contracts['cds'].append(self.trade_cds(np.flatnonzero(served), firm[served], contracts))
+        # book the firm loans
+        self.firm_equity = self.firm_equity + contracts['amount']
+        cds = contracts['cds']
+        contracts['cds'] = {name: np.concatenate([trades[name] for trades in cds]) if cds else np.zeros(0)
+                            for name in ('replica', 'buyer', 'seller', 'firm', 'notional', 'spread')}
+        for name in ('replica', 'buyer', 'seller', 'firm'):
+            contracts['cds'][name] = contracts['cds'][name].astype(int)
+        return contracts
+
+    def find_interbank_loans(self,
+                             r: np.ndarray,
+                             borrower: np.ndarray,
+                             credit_needed: np.ndarray,
+                             notional_amount: np.ndarray) -> tuple:
+        """
+        | Search interbank loans for one bank in each of the given replicas, see MatchingEngine.find_interbank_loan.
+
+        :param r: Replicas.
+        :param borrower: Borrowing bank of every replica.
+        :param credit_needed: Credit needed by every borrower.
+        :param notional_amount: Notional amount of the firm loan of every borrower.
+        :return: A tuple containing whether a loan was found, the lender and the interest rate of every search.
+        """
+        config, streams = self.config, self.streams
+        m = config.max_interbank_loan
+        if self.num_banks < 2:
+            return np.zeros(r.size, dtype=bool), np.zeros(r.size, dtype=int), np.zeros(r.size)
+        fragility = (notional_amount + self.loan_assets[r, borrower]) / self.deposits[r, borrower]
+        draws = streams['interbank_market'].integers(0, self.num_banks - 1, size=(r.size, m))
+        candidates = draws + (draws >= borrower[:, None])
+        uniforms = streams['loan_pricing'].random((r.size, m))
+        rates = config.policy_rate * (1 + h_theta * uniforms * np.tanh(fragility[:, None]))
+        rows = r[:, None]
+        needed = credit_needed[:, None]
+        assets = self.loan_assets[rows, candidates]
+        feasible = ((needed + assets <= self.max_credit[rows, candidates]) &
+                    (self.deposits[rows, candidates] + self.loan_liabilities[rows, candidates] - (needed + assets) > 0))
+        best = np.argmin(np.where(feasible, rates, np.inf), axis=1)
+        searches = np.arange(r.size)
+        return feasible.any(axis=1), candidates[searches, best], rates[searches, best]
+
+    def trade_cds(self,
+                  r: np.ndarray,
+                  firm: np.ndarray,
+                  contracts: dict) -> dict:
+        """
+        | Trade CDS on the loans just extended in the given replicas, see CDSMarket.best_offers and
+        MatchingEngine.check_cds. Every bank that wants a CDS asks max_cds_requests random banks that are neither
+        the lender nor a buyer for a quote and buys the cheapest one if it can pay the premium.
+
+        :param r: Replicas.
+        :param firm: Borrowing firm of every replica.
+        :param contracts: The contracts of the period, see credit_market.
+        :return: Dictionary with the replica, buyer, seller, reference firm, notional amount and spread of the bought
+            CDS.
+        """
+        config, rng = self.config, self.streams['cds_market']
+        searches = np.arange(r.size)
+        lender = contracts['lender'][r, firm]
+        notional = contracts['amount'][r, firm]
+        probabilities = np.full((r.size, self.num_banks), config.naked_cds_prob)
+        probabilities[searches, lender] = config.covered_cds_prob
+        interested = rng.random(probabilities.shape) < probabilities
+        excluded = interested.copy()
+        excluded[searches, lender] = True
+        # counterparties of every replica first, in the order of the banks
+        counterparties = np.argsort(excluded, axis=1, kind='stable')
+        num_counterparties = np.sum(~excluded, axis=1)
+        s, buyer = np.nonzero(interested & (num_counterparties[:, None] > 0))
+        sellers = counterparties[s[:, None], rng.integers(0, num_counterparties[s][:, None],
+                                                          size=(s.size, config.max_cds_requests))]
+        spreads = hull_cds_spread(self.default_probability[r[s], firm[s]][:, None],
+                                  contracts['rate'][r[s], firm[s]][:, None],
+                                  rng.normal(0, 0.01, size=sellers.shape), config.policy_rate)
+        best = np.argmin(spreads, axis=1)
+        quotes = np.arange(s.size)
+        seller, spread = sellers[quotes, best], spreads[quotes, best]
+        premium = spread * notional[s]
+        rows = r[s]
+        capacity = (self.deposits[rows, buyer] + self.loan_liabilities[rows, buyer] + self.bank_equity[rows, buyer] -
+                    (self.loan_assets[rows, buyer] + self.cds_premium[rows, buyer]))
+        bought = capacity >= premium
+        self.cds_premium[rows[bought], buyer[bought]] += premium[bought]
+        return {'replica': rows[bought], 'buyer': buyer[bought], 'seller': seller[bought],
+                'firm': firm[s][bought], 'notional': notional[s][bought], 'spread': spread[bought]}
+
+    def clear_goods_market(self):
+        """
+        | Adjust the production to the available funds and clear the goods market, see clear_goods_market.
+        """
+        config = self.config
+        short = self.total_wages != self.firm_equity
+        self.supply = np.where(short, self.firm_equity * self.productivity / self.wage, self.supply)
+        self.total_wages = np.where(short, self.firm_equity, self.total_wages)
+        mean = np.asarray(config.good_consumption, dtype=float)[self.economy_state]
+        std = np.asarray(config.good_consumption_std, dtype=float)[self.economy_state]
+        consumption = np.clip(self.streams['consumption'].normal(mean[:, None], std[:, None], self.supply.shape),
+                              config.min_consumption, config.max_consumption)
+        self.prev_equity = self.firm_equity
+        self.firm_equity = self.firm_equity - self.total_wages + self.price * consumption * self.supply
+        self.excess_supply = (1 - consumption) * self.supply
+
+    def settle_firm_loans(self, contracts: dict) -> tuple:
+        """
+        | Find the defaulted firms and repay the firm loans, see settle_firm_loans. Every firm has at most one loan.
+
+        :param contracts: The contracts of the period, see credit_market.
+        :return: A tuple containing the defaulted firms, the recovery rates and the money every bank receives from
+            its firm loans.
+        """
+        debt = (1 + contracts['rate']) * contracts['amount']
+        defaulted = self.firm_equity < debt
+        repayment = np.where(defaulted, self.firm_equity, debt)
+        has_loan = contracts['lender'] >= 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            recovery_rate = np.where(has_loan, repayment / debt, np.nan)
+        r, f = np.nonzero(has_loan)
+        money_from_firm_loans = np.zeros((self.runs, self.num_banks))
+        np.add.at(money_from_firm_loans, (r, contracts['lender'][r, f]), repayment[r, f])
+        self.firm_equity = self.firm_equity - repayment
+        return defaulted, recovery_rate, money_from_firm_loans
+
+    def clear_interbank_market(self,
+                               contracts: dict,
+                               defaulted_firms: np.ndarray,
+                               recovery_rate: np.ndarray,
+                               money_from_firm_loans: np.ndarray,
+                               deposit_change: np.ndarray) -> np.ndarray:
+        """
+        | Clear the interbank markets of all replicas with batched_clearing_vector and settle the deposits, see
+        clear_interbank_market.
+
+        :param contracts: The contracts of the period, see credit_market.
+        :param defaulted_firms: Boolean array of the defaulted firms.
+        :param recovery_rate: Recovery rate of every firm.
+        :param money_from_firm_loans: Money every bank receives from its firm loans.
+        :param deposit_change: Deposit shock of every bank.
+        :return: Boolean array of the defaulted banks.
+        """
+        R, B = self.runs, self.num_banks
+        liabilities = np.zeros((R, B, B))
+        r, f = np.nonzero(contracts['interbank_lender'] >= 0)
+        np.add.at(liabilities, (r, contracts['lender'][r, f], contracts['interbank_lender'][r, f]),
+                  contracts['interbank_amount'][r, f] * (1 + contracts['interbank_rate'][r, f]))
+        cds = contracts['cds']
+        np.add.at(liabilities, (cds['replica'], cds['buyer'], cds['seller']), cds['spread'] * cds['notional'])
+        triggered = defaulted_firms[cds['replica'], cds['firm']]
+        np.add.at(liabilities, (cds['replica'][triggered], cds['seller'][triggered], cds['buyer'][triggered]),
+                  cds['notional'][triggered] * (1 - recovery_rate[cds['replica'][triggered], cds['firm'][triggered]]))
+        initial_wealth = self.bank_equity + money_from_firm_loans + np.minimum(deposit_change, 0)
+        payments, clearing_defaults, inflows, _, _ = batched_clearing_vector(liabilities, initial_wealth)
+        earnings = initial_wealth + inflows - payments
+        money_for_deposits = self.deposits - self.current_deposits - np.maximum(deposit_change, 0)
+        defaulted = clearing_defaults | (earnings < money_for_deposits)
+        self.current_deposits = self.current_deposits + np.where(defaulted, earnings, money_for_deposits)
+        self.deposits = self.current_deposits + np.maximum(deposit_change, 0)
+        self.bank_equity = np.where(defaulted, 0, earnings - money_for_deposits)
+        return defaulted
+
+    def record(self,
+               contracts: dict,
+               defaulted_firms: np.ndarray,
+               defaulted_banks: np.ndarray):
+        """
+        | Record the metrics of the period for every replica, see analytics.
+
+        :param contracts: The contracts of the period, see credit_market.
+        :param defaulted_firms: Boolean array of the defaulted firms.
+        :param defaulted_banks: Boolean array of the defaulted banks.
+        """
+        cds = contracts['cds']
+        totals = {'firmloan': (np.sum(contracts['amount'], axis=1),
+                               np.sum(contracts['amount'] * contracts['rate'], axis=1)),
+                  'bankloan': (np.sum(contracts['interbank_amount'], axis=1),
+                               np.sum(contracts['interbank_amount'] * contracts['interbank_rate'], axis=1)),
+                  'cds': (np.bincount(cds['replica'], weights=cds['notional'], minlength=self.runs),
+                          np.bincount(cds['replica'], weights=cds['notional'] * cds['spread'], minlength=self.runs))}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average_rates = {name: np.where(total == 0, 0, weighted / total)
+                             for name, (total, weighted) in totals.items()}
+        total_firm_equity = np.sum(self.firm_equity, axis=1)
+        metrics = {'market_price': self.market_price,
+                   'average_wage': np.mean(self.wage, axis=1),
+                   'bank_defaults': np.sum(defaulted_banks, axis=1),
+                   'firm_defaults': np.sum(defaulted_firms, axis=1),
+                   'average_firmloan_ir': average_rates['firmloan'],
+                   'average_bankloan_ir': average_rates['bankloan'],
+                   'average_cds_spread': average_rates['cds'],
+                   'total_firmloan': totals['firmloan'][0],
+                   'total_bankloan': totals['bankloan'][0],
+                   'total_cds_notional': totals['cds'][0],
+                   'bank_equity': np.sum(self.bank_equity, axis=1),
+                   'bank_deposits': np.sum(self.deposits, axis=1),
+                   'firm_equity': total_firm_equity,
+                   'firm_market_power': np.max(self.firm_equity, axis=1) / total_firm_equity}
+        self.history['values'].append(np.stack([metrics[name] for name in HistoricData.metrics], axis=1))
+        self.history['bank_equity'].append(self.bank_equity.copy())
+        self.history['bank_numbers'].append(self.bank_numbers.copy())
+
+    def regenerate(self,
+                   defaulted_firms: np.ndarray,
+                   defaulted_banks: np.ndarray):
+        """
+        | Pay the dividends of the surviving firms and replace the defaulted firms and banks by new ones drawn around
+        the survivors of their replica, see generate_new_entities.
+
+        :param defaulted_firms: Boolean array of the defaulted firms.
+        :param defaulted_banks: Boolean array of the defaulted banks.
+        """
+        config, rng = self.config, self.streams['entry']
+        if self.t > 0:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                dividend = np.maximum(self.firm_equity / self.prev_equity - 1, 0)
+            self.firm_equity = np.where(defaulted_firms, self.firm_equity,
+                                        self.firm_equity - config.dividend_ratio * dividend * self.firm_equity)
+        shape = self.bank_equity.shape
+        for name in ('bank_equity', 'deposits'):
+            mean, std = masked_mean_std(getattr(self, name), ~defaulted_banks)
+            new_values = rng.normal(mean[:, None], std[:, None] ** 0.1, shape)
+            setattr(self, name, np.where(defaulted_banks, new_values, getattr(self, name)))
+        shape = self.firm_equity.shape
+        for name, minimum in (('supply', 70), ('excess_supply', 0), ('price', self.market_price[:, None] / 2),
+                              ('wage', min_wage), ('firm_equity', 100), ('default_probability', 0.01)):
+            mean, std = masked_mean_std(getattr(self, name), ~defaulted_firms)
+            new_values = np.maximum(rng.normal(mean[:, None], std[:, None], shape), minimum)
+            setattr(self, name, np.where(defaulted_firms, new_values, getattr(self, name)))
+        # new ids for the replaced banks
+        new_numbers = self.next_bank_number[:, None] + np.cumsum(defaulted_banks, axis=1) - 1
+        self.bank_numbers = np.where(defaulted_banks, new_numbers, self.bank_numbers)
+        self.next_bank_number = self.next_bank_number + np.sum(defaulted_banks, axis=1)
+
+    def historic_data(self) -> list:
+        """
+        | The historic data of every replica.
+
+        :return: List of HistoricData stores, one per replica.
+        """
+        if len(self.history['values']) == 0:
+            return [HistoricData() for _ in range(self.runs)]
+        values = np.stack(self.history['values'], axis=1)
+        bank_equity = np.stack(self.history['bank_equity'], axis=1)
+        bank_numbers = np.stack(self.history['bank_numbers'], axis=1)
+        return [HistoricData.from_arrays(values[r], bank_equity[r],
+                                         [[f'bank_{number}' for number in numbers] for numbers in bank_numbers[r]])
+                for r in range(self.runs)]
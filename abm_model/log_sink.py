@@ -0,0 +1,86 @@
+import os
+import glob
+import numpy as np
+from abm_model.logs import EventLog, EventView
+
+
+class LogSink:
+    """
+    | Destination for the events flushed by an EventLog. Subclasses implement write.
+    """
+    def write(self, view: EventView):
+        """
+        | Store a chunk of events.
+
+        :param view: EventView on the flushed rows, together with the agent names of the chunk.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        | Release the resources of the sink.
+        """
+
+
+class NpzSink(LogSink):
+    """
+    | Sink that writes every flushed chunk to its own compressed numpy file events_000000.npz, events_000001.npz,
+    ... in a directory. A chunk holds the event columns and the agent names used to decode the agent codes.
+    Every run needs its own directory, so a directory that already holds chunk files is refused.
+    """
+    def __init__(self, directory: str):
+        """
+        | Set up the sink and create the directory if needed.
+
+        :param directory: Directory of the chunk files.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        if len(chunk_files(directory)) > 0:
+            raise FileExistsError(f'The directory {directory} already holds an event log.')
+        self.chunks = 0
+
+    def write(self, view: EventView):
+        path = os.path.join(self.directory, f'events_{self.chunks:06d}.npz')
+        np.savez_compressed(path, agent_names=np.array(view.agent_names, dtype=str), **view.data)
+        self.chunks += 1
+
+
+def chunk_files(directory: str) -> list:
+    """
+    | Chunk files of a NpzSink in the order they were written.
+
+    :param directory: Directory of the chunk files.
+    :return: Sorted list of file paths.
+    """
+    return sorted(glob.glob(os.path.join(directory, 'events_*.npz')))
+
+
+def read_event_log(directory: str):
+    """
+    | Read an event log written by a NpzSink lazily, one chunk at a time, so that only a single chunk is held in
+    memory.
+
+    :param directory: Directory of the chunk files.
+    :return: Generator of EventView objects, one per chunk.
+    """
+    for path in chunk_files(directory):
+        with np.load(path) as chunk:
+            data = {name: chunk[name] for name in EventLog.columns}
+            agent_names = [str(name) for name in chunk['agent_names']]
+        yield EventView(data, agent_names)
+
+
+def read_period(directory: str, t: int) -> EventView:
+    """
+    | Read the events of a single period from an event log written by a NpzSink.
+
+    :param directory: Directory of the chunk files.
+    :param t: The simulation period.
+    :return: The EventView, empty if the period has no events.
+    """
+    for view in read_event_log(directory):
+        if len(view) > 0 and view.period[0] <= t <= view.period[-1]:
+            rows = view.period == t
+            return EventView({name: column[rows] for name, column in view.data.items()}, view.agent_names)
+    return EventView({name: np.empty(0, dtype=dtype) for name, dtype in EventLog.columns.items()}, [])
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 
 
 class LogMessage:
@@ -39,3 +42,199 @@ class LogMessage:
         :param data: A list representing the data to be set.
         """
         self.data = data
+
+
+class EventLog:
+    """
+    | Columnar log of all transactions and defaults of a simulation. Every event is stored by value in typed
+    arrays: period, event type, lender (or CDS buyer), borrower (or CDS seller, or defaulted agent), reference
+    entity, notional amount and rate (interest rate or CDS spread). Agent ids are stored as integer codes that
+    are decoded with agent_names. The arrays grow by doubling, so appending is amortized O(1).
+    If a sink is given, the buffered rows are written to the sink on flush, and at the latest at the start of the
+    first period after max_rows rows are buffered, after which a new buffer and agent code table are started.
+    Views handed out before a flush keep the old buffer alive, so they stay valid.
+    """
+    LOAN = 0
+    INTERBANK_LOAN = 1
+    CDS = 2
+    FIRM_DEFAULT = 3
+    BANK_DEFAULT = 4
+    event_names = {LOAN: 'loan', INTERBANK_LOAN: 'interbank loan', CDS: 'cds', FIRM_DEFAULT: 'firm default',
+                   BANK_DEFAULT: 'bank default'}
+    columns = {'period': np.int32, 'event_type': np.int8, 'lender': np.int32, 'borrower': np.int32,
+               'reference_entity': np.int32, 'notional': np.float64, 'rate': np.float64}
+
+    def __init__(self, capacity: int = 1024, sink=None, max_rows: int = None):
+        """
+        | Set up an empty log.
+
+        :param capacity: Initial number of rows that are allocated.
+        :param sink: Optional sink with a write(view) method that receives the buffered rows on flush.
+        :param max_rows: Maximum number of buffered rows before an automatic flush to the sink.
+        """
+        self.capacity = capacity
+        self.sink = sink
+        self.max_rows = max_rows
+        self.flushed_rows = 0
+        self._new_buffer()
+
+    def _new_buffer(self):
+        """
+        | Start a new empty buffer and agent code table.
+        """
+        self.data = {name: np.empty(self.capacity, dtype=dtype) for name, dtype in self.columns.items()}
+        self.size = 0
+        self.agent_codes = {}
+        self.agent_names = []
+        # first row and row after the last one of every buffered period
+        self.period_ranges = {}
+
+    def flush(self):
+        """
+        | Write the buffered rows to the sink and start a new buffer. Does nothing without a sink.
+        """
+        if self.sink is None or self.size == 0:
+            return
+        self.sink.write(self.rows())
+        self.flushed_rows += self.size
+        self._new_buffer()
+
+    def agent_code(self, agent_id: str) -> int:
+        """
+        | Integer code of an agent id, assigned at first use.
+
+        :param agent_id: The agent id, None for no agent.
+        :return: The code, -1 for no agent.
+        """
+        if agent_id is None:
+            return -1
+        code = self.agent_codes.get(agent_id)
+        if code is None:
+            code = len(self.agent_names)
+            self.agent_codes[agent_id] = code
+            self.agent_names.append(agent_id)
+        return code
+
+    def append(self,
+               period: int,
+               event_type: int,
+               lender: str,
+               borrower: str,
+               reference_entity: str,
+               notional: float,
+               rate: float):
+        """
+        | Append one event to the log.
+
+        :param period: The simulation period of the event.
+        :param event_type: One of the event type constants of the class.
+        :param lender: The lender or CDS buyer.
+        :param borrower: The borrower, the CDS seller or the defaulted agent.
+        :param reference_entity: The reference entity of a CDS, None otherwise.
+        :param notional: The notional amount of the contract, the equity of a defaulted agent.
+        :param rate: The interest rate of a loan or the spread of a CDS.
+        """
+        # flush only when a new period starts, so that every period is written in one chunk
+        if (self.sink is not None and self.max_rows is not None and self.size >= self.max_rows
+                and period not in self.period_ranges):
+            self.flush()
+        if self.size == len(self.data['period']):
+            for name in self.columns:
+                self.data[name] = np.concatenate([self.data[name], np.empty_like(self.data[name])])
+        if period not in self.period_ranges:
+            self.period_ranges[period] = [self.size, self.size]
+        row = self.size
+        self.data['period'][row] = period
+        self.data['event_type'][row] = event_type
+        self.data['lender'][row] = self.agent_code(lender)
+        self.data['borrower'][row] = self.agent_code(borrower)
+        self.data['reference_entity'][row] = self.agent_code(reference_entity)
+        self.data['notional'][row] = notional
+        self.data['rate'][row] = rate
+        self.size += 1
+        self.period_ranges[period][1] = self.size
+
+    def record_loan(self, period: int, loan, interbank: bool = False):
+        """
+        | Record an extended loan.
+
+        :param period: The simulation period.
+        :param loan: The Loan object.
+        :param interbank: True for an interbank loan.
+        """
+        self.append(period, self.INTERBANK_LOAN if interbank else self.LOAN, loan.lender, loan.borrower, None,
+                    loan.notional_amount, loan.interest_rate)
+
+    def record_cds(self, period: int, cds):
+        """
+        | Record a sold CDS.
+
+        :param period: The simulation period.
+        :param cds: The CDS object.
+        """
+        self.append(period, self.CDS, cds.buyer, cds.seller, cds.reference_entity, cds.notional_amount, cds.spread)
+
+    def record_default(self, period: int, agent_id: str, equity: float, bank: bool = False):
+        """
+        | Record the default of an agent.
+
+        :param period: The simulation period.
+        :param agent_id: The id of the defaulted agent.
+        :param equity: The equity of the agent at default.
+        :param bank: True for a bank, False for a firm.
+        """
+        self.append(period, self.BANK_DEFAULT if bank else self.FIRM_DEFAULT, None, agent_id, None, equity, np.nan)
+
+    def rows(self, start: int = 0, stop: int = None) -> 'EventView':
+        """
+        | View on a range of rows without copying.
+
+        :param start: First row.
+        :param stop: Row after the last one, the end of the log if None.
+        :return: The EventView.
+        """
+        stop = self.size if stop is None else stop
+        return EventView({name: column[start:stop] for name, column in self.data.items()}, self.agent_names)
+
+    def period(self, t: int) -> 'EventView':
+        """
+        | View on the buffered events of a period without copying. Periods are contiguous since events are appended
+        in chronological order. Rows already flushed to the sink are not part of the view.
+
+        :param t: The simulation period.
+        :return: The EventView.
+        """
+        start, stop = self.period_ranges.get(t, (self.size, self.size))
+        return self.rows(start, stop)
+
+    def __len__(self):
+        return self.flushed_rows + self.size
+
+
+class EventView:
+    """
+    | Read-only columnar view on rows of an EventLog. Columns are available as array attributes.
+    """
+    def __init__(self, data: dict, agent_names: list):
+        """
+        | Wrap the column arrays.
+
+        :param data: Dictionary of column name to array.
+        :param agent_names: Agent ids by code.
+        """
+        self.data = data
+        self.agent_names = agent_names
+        for name, column in data.items():
+            setattr(self, name, column)
+
+    def names(self, column: str) -> list:
+        """
+        | Decode an agent column into agent ids.
+
+        :param column: 'lender', 'borrower' or 'reference_entity'.
+        :return: List of agent ids, None for no agent.
+        """
+        return [self.agent_names[code] if code >= 0 else None for code in self.data[column]]
+
+    def __len__(self):
+        return len(self.data['period'])
@@ -1,12 +1,11 @@
 import numpy as np
-import random
 
 
 class MarkovModel:
     """
     | Class that represents a Markov model.
     """
-    def __init__(self, starting_prob, transition_matrix, states):
+    def __init__(self, starting_prob, transition_matrix, states, rng=None):
         """
         | Constructor method of the MarkovModel class. It initializes a MarkovModel object with the
         specified parameters.
@@ -14,6 +13,7 @@ class MarkovModel:
         :param starting_prob: List of probabilities representing the starting probabilities for each state.
         :param transition_matrix: Square matrix representing the transition probabilities between states.
         :param states: A dictionary mapping state indices to state names.
+        :param rng: Random number generator used for the state transitions. A fresh generator is used if None.
         """
         assert (np.shape(transition_matrix)[0] ==
                 np.shape(transition_matrix)[1]), f"Please give a square transition matrix"
@@ -25,15 +25,18 @@ class MarkovModel:
         self.starting_prob = starting_prob
         self.transition_matrix = np.array(transition_matrix)
         self.states = states
+        self.rng = np.random.default_rng() if rng is None else rng
         # generate initial state
-        self.current_state = random.choices(population=list(self.states.keys()),
-                                            weights=self.starting_prob)[0]
+        population = list(self.states.keys())
+        self.current_state = population[self.rng.choice(len(population), p=self.starting_prob)]
 
     def get_next_state(self):
         """
         | Updates the current state of the Markov model to the next state based on the transition probabilities.
-        It randomly selects the next state using random.choices() based on the transition probabilities associated
-        with the current state. The selection is weighted according to the probabilities in the transition matrix.
+        It randomly selects the next state with the generator of the model based on the transition probabilities
+        associated with the current state. The selection is weighted according to the probabilities in the transition
+        matrix.
         """
-        self.current_state = random.choices(population=list(self.states.keys()),
-                                            weights=self.transition_matrix[self.current_state])[0]
\ No newline at end of file
+        population = list(self.states.keys())
+        self.current_state = population[self.rng.choice(len(population),
+                                                        p=self.transition_matrix[self.current_state])]
\ No newline at end of file
@@ -0,0 +1,171 @@
+from abm_model.banks import BaseBank
+from abm_model.loan import Loan
+from abm_model.population import AgentPopulation, agent_values, set_agent_values
+import numpy as np
+
+
+class MatchingEngine:
+    """
+    | Matching engine of the credit market. Firms are processed in a queue against per-bank capacity counters,
+    interbank top-ups are searched among precomputed candidate lenders, and the accepted contracts are collected
+    in a contract store that is booked into the banks and firms in bulk at the end. The allocation rules and the
+    order of all random draws are the same as booking every contract on the agents directly, so the resulting
+    network is identical.
+    The counters are Python lists rather than numpy arrays, since the queue updates single entries, where list
+    access is much faster than numpy scalar access. They are converted from and to the agent arrays once per
+    period.
+    """
+    def __init__(self,
+                 banks: dict,
+                 banks_idx: list,
+                 rng: np.random.Generator):
+        """
+        | Read the capacity counters of the banks.
+
+        :param banks: Dictionary of banks or a BankPopulation.
+        :param banks_idx: List of bank ids from which the interbank candidates are drawn.
+        :param rng: Random number generator.
+        """
+        self.rng = rng
+        self.bank_ids = list(banks)
+        self.positions = {bank_id: i for i, bank_id in enumerate(self.bank_ids)}
+        # position of the banks in banks_idx, which defines the candidates of the interbank search
+        self.candidates = [self.positions[bank_id] for bank_id in banks_idx]
+        self.candidate_rank = {position: rank for rank, position in enumerate(self.candidates)}
+        for name in ('deposits', 'max_credit', 'equity', 'current_deposits', 'loan_assets', 'loan_liabilities',
+                     'cds_premium'):
+            setattr(self, name, np.asarray(agent_values(banks, name), dtype=float).tolist())
+        # contract store: loans and CDS of every bank in booking order, and loans of every firm
+        self.bank_assets = {'loans': [[] for _ in self.bank_ids], 'cds': [[] for _ in self.bank_ids]}
+        self.bank_liabilities = {'loans': [[] for _ in self.bank_ids], 'cds': [[] for _ in self.bank_ids]}
+        self.firm_loans = []
+
+    def check_loan(self, lender: int, notional_amount: float):
+        """
+        | Check if a bank can grant a loan, see Bank.check_loan.
+
+        :param lender: Position of the lender.
+        :param notional_amount: Notional amount of the loan.
+        :return: False if the loan cannot be granted, otherwise the funds left after granting it.
+        """
+        if notional_amount + self.loan_assets[lender] > self.max_credit[lender]:
+            return False
+        return self.deposits[lender] + self.loan_liabilities[lender] - (notional_amount + self.loan_assets[lender])
+
+    def check_cds(self, buyer: int, premium: float) -> bool:
+        """
+        | Check if a bank can pay the premium of a CDS, see Bank.check_cds.
+
+        :param buyer: Position of the buyer.
+        :param premium: The CDS premium.
+        :return: True if the CDS is affordable.
+        """
+        return (self.deposits[buyer] + self.loan_liabilities[buyer] + self.equity[buyer] -
+                (self.loan_assets[buyer] + self.cds_premium[buyer]) >= premium)
+
+    def find_interbank_loan(self, borrower: int, credit_needed: float, notional_amount: float):
+        """
+        | Search an interbank loan among max_interbank_loan random candidate lenders, see
+        Bank.get_potential_interbank_loans. The offers are priced in one batch and the cheapest offer of a
+        lender with enough funds is returned.
+
+        :param borrower: Position of the borrowing bank.
+        :param credit_needed: The credit needed to extend the firm loan.
+        :param notional_amount: The notional amount of the firm loan.
+        :return: The interbank loan or None if no lender is found.
+        """
+        financial_fragility = (notional_amount + self.loan_assets[borrower]) / self.deposits[borrower]
+        rank = self.candidate_rank[borrower]
+        draws = self.rng.integers(0, len(self.candidates) - 1, size=BaseBank.max_interbank_loan)
+        lenders = [self.candidates[j if j < rank else j + 1] for j in draws.tolist()]
+        offers = BaseBank.price_loan_requests([Loan(lender=self.bank_ids[lender],
+                                                    borrower=self.bank_ids[borrower],
+                                                    notional_amount=credit_needed,
+                                                    financial_fragility_borrower=financial_fragility)
+                                               for lender in lenders],
+                                              np.array([self.max_credit[lender] for lender in lenders]))
+        offers = [offer for offer in offers if self.check_loan(self.positions[offer.lender], credit_needed) > 0]
+        if len(offers) == 0:
+            return None
+        return min(offers, key=lambda offer: offer.interest_rate)
+
+    def match(self, firm_queue: list, loan_offers: dict):
+        """
+        | Process the firms in the order of the queue. Every firm takes the cheapest offer that its lender can
+        grant, if necessary after an interbank top-up of the lender.
+
+        :param firm_queue: List of firm ids in the order in which they choose their loans.
+        :param loan_offers: Dictionary that has as keys the firm ids and as values the offers sorted by rate.
+        :return: Generator of tuples (firm loan, interbank loan or None), one per extended firm loan, yielded after
+            the contracts are entered in the counters so that the caller can trade CDS on the loan.
+        """
+        for firm_id in firm_queue:
+            for loan in loan_offers[firm_id]:
+                lender = self.positions[loan.lender]
+                bank_condition = self.check_loan(lender, loan.notional_amount)
+                if not bank_condition:  # bank is above the maximum leverage if it accepts the loan
+                    continue
+                bank_loan = None
+                if bank_condition < 0:  # the bank needs an interbank loan to extend the loan
+                    bank_loan = self.find_interbank_loan(lender, -bank_condition, loan.notional_amount)
+                    if bank_loan is None:
+                        continue
+                    interbank_lender = self.positions[bank_loan.lender]
+                    self.current_deposits[interbank_lender] -= bank_loan.notional_amount
+                    self.add_loan(interbank_lender, lender, bank_loan)
+                self.add_loan(lender, None, loan)
+                self.current_deposits[lender] -= loan.notional_amount
+                self.firm_loans.append(loan)
+                yield loan, bank_loan
+                break
+
+    def add_loan(self, lender: int, borrower, loan: Loan):
+        """
+        | Enter a loan in the counters and the contract store.
+
+        :param lender: Position of the lender.
+        :param borrower: Position of the borrowing bank, None for a firm loan.
+        :param loan: The loan.
+        """
+        self.bank_assets['loans'][lender].append(loan)
+        self.loan_assets[lender] += loan.notional_amount
+        if borrower is not None:
+            self.bank_liabilities['loans'][borrower].append(loan)
+            self.loan_liabilities[borrower] += loan.notional_amount
+
+    def add_cds(self, cds):
+        """
+        | Enter a CDS in the counters and the contract store.
+
+        :param cds: The CDS.
+        """
+        buyer = self.positions[cds.buyer]
+        self.bank_assets['cds'][buyer].append(cds)
+        self.cds_premium[buyer] += cds.spread * cds.notional_amount
+        self.bank_liabilities['cds'][self.positions[cds.seller]].append(cds)
+
+    def book(self, banks: dict, firms: dict):
+        """
+        | Book the contracts of the store and the counters into the banks and firms in bulk.
+
+        :param banks: Dictionary of banks or a BankPopulation.
+        :param firms: Dictionary of firms or a FirmPopulation.
+        """
+        for name in ('current_deposits', 'loan_assets', 'loan_liabilities', 'cds_premium'):
+            set_agent_values(banks, name, getattr(self, name))
+        bank_lists = zip(agent_values(banks, 'assets'), agent_values(banks, 'liabilities'),
+                         *self.bank_assets.values(), *self.bank_liabilities.values())
+        for assets, liabilities, asset_loans, asset_cds, liability_loans, liability_cds in bank_lists:
+            assets['loans'] += asset_loans
+            assets['cds'] += asset_cds
+            liabilities['loans'] += liability_loans
+            liabilities['cds'] += liability_cds
+        if isinstance(firms, AgentPopulation):
+            borrowers = np.array([firms.index[loan.borrower] for loan in self.firm_loans], dtype=int)
+            np.add.at(firms.equity, borrowers, [loan.notional_amount for loan in self.firm_loans])
+            for borrower, loan in zip(borrowers, self.firm_loans):
+                firms.loans[borrower].append(loan)
+        else:
+            for loan in self.firm_loans:
+                firms[loan.borrower].loans.append(loan)
+                firms[loan.borrower].equity += loan.notional_amount
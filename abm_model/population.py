@@ -0,0 +1,248 @@
+import numpy as np
+import copy
+
+
+class AgentPopulation:
+    """
+    | Struct-of-arrays container for a group of agents. Every numeric agent variable listed in array_fields is
+    stored in a contiguous float array, the variables in list_fields (e.g. contract lists) in Python lists.
+    The population behaves like the dictionary of agents used elsewhere in the model: indexing it with an agent id
+    returns a view object that reads and writes the arrays, so code written for agent objects keeps working.
+    """
+    # numeric agent variables stored as arrays
+    array_fields = ()
+    # variables passed to the constructor of the agent class, in order, after the id
+    agent_fields = ()
+    # per-agent variables that are stored in Python lists
+    list_fields = ()
+    agent_class = None
+    view_class = None
+
+    def _init_arrays(self, ids: list, values: dict):
+        """
+        | Set up ids, arrays and lists. Array variables without values are initialized to nan.
+
+        :param ids: List of unique agent identifiers.
+        :param values: Dictionary with the values of the variables in agent_fields, in the order of the ids.
+        """
+        self.ids = list(ids)
+        self.index = {agent_id: i for i, agent_id in enumerate(self.ids)}
+        for name in self.array_fields:
+            setattr(self, name, np.array(values[name], dtype=float) if name in values
+                    else np.full(len(self.ids), np.nan))
+        for name in self.list_fields:
+            setattr(self, name, [self.empty_list_field(name) for _ in self.ids])
+
+    @staticmethod
+    def empty_list_field(name: str):
+        """
+        | Value of a list field for an agent without contracts.
+
+        :param name: Name of the list field.
+        :return: The empty value.
+        """
+        return None
+
+    @classmethod
+    def from_agents(cls, agents: dict):
+        """
+        | Build a population from a dictionary of agent objects.
+
+        :param agents: Dictionary of agent objects keyed by agent id.
+        :return: The population.
+        """
+        population = cls(list(agents.keys()), *[[getattr(agent, name) for agent in agents.values()]
+                                                 for name in cls.agent_fields])
+        for name in cls.array_fields:
+            if name not in cls.agent_fields:
+                getattr(population, name)[:] = [np.nan if getattr(agent, name) is None else getattr(agent, name)
+                                                for agent in agents.values()]
+        for name in cls.list_fields:
+            setattr(population, name, [getattr(agent, name) for agent in agents.values()])
+        return population
+
+    # dictionary interface
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, agent_id):
+        return agent_id in self.index
+
+    def __getitem__(self, agent_id):
+        return self.view_class(self, self.index[agent_id])
+
+    def __setitem__(self, agent_id, agent):
+        self.update({agent_id: agent})
+
+    def keys(self):
+        return list(self.ids)
+
+    def values(self):
+        return [self.view_class(self, i) for i in range(len(self.ids))]
+
+    def items(self):
+        return [(agent_id, self.view_class(self, i)) for i, agent_id in enumerate(self.ids)]
+
+    def update(self, agents: dict):
+        """
+        | Add agent objects to the population, or overwrite the values of existing agents, in a single pass.
+
+        :param agents: Dictionary of agent objects keyed by agent id.
+        """
+        new_ids = [agent_id for agent_id in agents if agent_id not in self.index]
+        for agent_id, agent in agents.items():
+            if agent_id in self.index:
+                view = self[agent_id]
+                for name in self.array_fields + self.list_fields:
+                    setattr(view, name, getattr(agent, name))
+        if len(new_ids) == 0:
+            return
+        for name in self.array_fields:
+            new_values = [getattr(agents[agent_id], name) for agent_id in new_ids]
+            new_values = [np.nan if value is None else value for value in new_values]
+            setattr(self, name, np.concatenate([getattr(self, name), np.array(new_values, dtype=float)]))
+        for name in self.list_fields:
+            getattr(self, name).extend([getattr(agents[agent_id], name) for agent_id in new_ids])
+        self.index.update({agent_id: len(self.ids) + i for i, agent_id in enumerate(new_ids)})
+        self.ids += new_ids
+
+    def remove(self, agent_ids: list):
+        """
+        | Remove agents from the population. Views created before the removal become invalid.
+
+        :param agent_ids: List of agent ids to remove.
+        """
+        if len(agent_ids) == 0:
+            return
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[[self.index[agent_id] for agent_id in agent_ids]] = False
+        for name in self.array_fields:
+            setattr(self, name, getattr(self, name)[keep])
+        positions = np.flatnonzero(keep)
+        self.ids = [self.ids[i] for i in positions]
+        for name in self.list_fields:
+            values = getattr(self, name)
+            setattr(self, name, [values[i] for i in positions])
+        self.index = {agent_id: i for i, agent_id in enumerate(self.ids)}
+
+    def reset_list_fields(self):
+        """
+        | Reset the list fields of all agents to their empty value.
+        """
+        for name in self.list_fields:
+            setattr(self, name, [self.empty_list_field(name) for _ in self.ids])
+
+
+def agent_values(agents: dict,
+                 name: str):
+    """
+    | Collect a variable of all agents, reading the array directly if the agents are an AgentPopulation.
+
+    :param agents: A dictionary of agents or an AgentPopulation.
+    :param name: Name of the agent variable.
+    :return: The values of the variable for all agents.
+    """
+    if isinstance(agents, AgentPopulation):
+        return getattr(agents, name)
+    return [getattr(agent, name) for agent in agents.values()]
+
+
+def set_agent_values(agents: dict,
+                     name: str,
+                     values):
+    """
+    | Set a variable of all agents, writing the array directly if the agents are an AgentPopulation.
+
+    :param agents: A dictionary of agents or an AgentPopulation.
+    :param name: Name of the agent variable.
+    :param values: The values of the variable, in the order of the agents.
+    """
+    if isinstance(agents, AgentPopulation):
+        getattr(agents, name)[:] = values
+        return
+    if isinstance(values, np.ndarray):
+        # agent objects hold Python scalars
+        values = values.tolist()
+    for agent, value in zip(agents.values(), values):
+        setattr(agent, name, value)
+
+
+class AgentView:
+    """
+    | Mixin for the object view on a single agent of a population. Combined with an agent class it supports
+    the attributes and methods of that class, reading and writing the arrays of the population.
+    """
+    def __init__(self, population: AgentPopulation, i: int):
+        """
+        | Create the view without copying any agent variable.
+
+        :param population: The population that holds the agent.
+        :param i: The position of the agent in the population arrays.
+        """
+        self.population = population
+        self.i = i
+
+    @property
+    def idx(self):
+        return self.population.ids[self.i]
+
+    def to_agent(self):
+        """
+        | Detach the view into a standalone agent object with the current values.
+
+        :return: The agent object.
+        """
+        population = self.population
+        agent = population.agent_class(self.idx, *[getattr(self, name) for name in population.agent_fields])
+        for name in population.array_fields + population.list_fields:
+            setattr(agent, name, getattr(self, name))
+        return agent
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.to_agent(), memo)
+
+
+def _array_property(name: str) -> property:
+    """
+    | Create a view property that reads and writes an array variable of the population.
+
+    :param name: Name of the agent variable.
+    :return: The property.
+    """
+    def getter(self):
+        value = getattr(self.population, name)[self.i]
+        return None if np.isnan(value) else float(value)
+
+    def setter(self, value):
+        getattr(self.population, name)[self.i] = np.nan if value is None else value
+    return property(getter, setter)
+
+
+def _list_property(name: str) -> property:
+    """
+    | Create a view property that reads and writes a list variable of the population.
+
+    :param name: Name of the agent variable.
+    :return: The property.
+    """
+    def getter(self):
+        return getattr(self.population, name)[self.i]
+
+    def setter(self, value):
+        getattr(self.population, name)[self.i] = value
+    return property(getter, setter)
+
+
+def install_view_properties(population_class):
+    """
+    | Install the properties of all array and list fields of a population class on its view class.
+
+    :param population_class: The population class.
+    """
+    for name in population_class.array_fields:
+        setattr(population_class.view_class, name, _array_property(name))
+    for name in population_class.list_fields:
+        setattr(population_class.view_class, name, _list_property(name))
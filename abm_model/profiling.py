@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+import time
+import tracemalloc
+
+
+class PhaseProfiler:
+    """
+    | Records the wall time and, optionally, the peak memory of the phases of a simulation period. The values are
+    aggregated per phase over the whole run and returned as a structured report.
+    """
+    def __init__(self, trace_memory: bool = False):
+        """
+        | Set up an empty profiler.
+
+        :param trace_memory: Also record the peak memory allocated during each phase with tracemalloc. This slows
+            down the simulation considerably.
+        """
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # per phase: number of calls, total, maximum time and peak memory
+        self.phases = {}
+        # wall time of every period
+        self.period_times = []
+        self.current_period_time = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        | Context manager that measures the enclosed phase.
+
+        :param name: Name of the phase.
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = self.phases.setdefault(name, {'calls': 0, 'total_time': 0.0, 'max_time': 0.0,
+                                                  'peak_memory': 0})
+            stats['calls'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            if self.trace_memory:
+                stats['peak_memory'] = max(stats['peak_memory'], tracemalloc.get_traced_memory()[1] - start_memory)
+            self.current_period_time += elapsed
+
+    def end_period(self) -> float:
+        """
+        | Close the current period.
+
+        :return: The wall time of the phases of the period in seconds.
+        """
+        period_time = self.current_period_time
+        self.period_times.append(period_time)
+        self.current_period_time = 0
+        return period_time
+
+    def report(self) -> dict:
+        """
+        | Aggregate the measurements of the run.
+
+        :return: Dictionary with the number of periods, the total time and, per phase, the number of calls, the
+            total, mean and maximum time in seconds, the share of the total time and, if traced, the peak memory
+            in bytes.
+        """
+        total_time = sum(stats['total_time'] for stats in self.phases.values())
+        phases = {}
+        for name, stats in self.phases.items():
+            phases[name] = {'calls': stats['calls'],
+                            'total_time': stats['total_time'],
+                            'mean_time': stats['total_time'] / stats['calls'],
+                            'max_time': stats['max_time'],
+                            'share': stats['total_time'] / total_time if total_time > 0 else 0}
+            if self.trace_memory:
+                phases[name]['peak_memory'] = stats['peak_memory']
+        return {'periods': len(self.period_times), 'total_time': total_time, 'phases': phases}
+
+
+def format_report(report: dict) -> str:
+    """
+    | Format a profiler report as a table.
+
+    :param report: Report returned by PhaseProfiler.report.
+    :return: The table as a string.
+    """
+    lines = [f"{report['periods']} periods in {report['total_time']:.3f} s",
+             f"{'phase':<28}{'calls':>8}{'total [s]':>12}{'mean [ms]':>12}{'max [ms]':>12}{'share':>8}"
+             f"{'peak [MB]':>12}"]
+    for name, stats in sorted(report['phases'].items(), key=lambda item: -item[1]['total_time']):
+        peak = f"{stats['peak_memory'] / 2 ** 20:>12.2f}" if 'peak_memory' in stats else f"{'-':>12}"
+        lines.append(f"{name:<28}{stats['calls']:>8}{stats['total_time']:>12.3f}{1000 * stats['mean_time']:>12.3f}"
+                     f"{1000 * stats['max_time']:>12.3f}{stats['share']:>8.1%}{peak}")
+    return '\n'.join(lines)
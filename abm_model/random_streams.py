@@ -0,0 +1,66 @@
+import numpy as np
+import zlib
+
+# exogenous random streams that are shared across scenarios in the common random numbers mode
+common_streams = ('economy_state', 'consumption', 'deposit_shocks', 'firm_adjustments')
+
+
+def stream_seed(seed, name: str) -> np.random.SeedSequence:
+    """
+    | Derive the seed sequence of a named stream from the seed of a run. The stream is a child of the run seed
+    whose spawn key is a hash of the name, so it only depends on the run seed and the name, and not on which or
+    how many other streams are derived.
+
+    :param seed: Seed of the run, either an integer, a numpy.random.SeedSequence or None.
+    :param name: Name of the stream.
+    :return: The seed sequence of the stream.
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (zlib.crc32(name.encode()),))
+
+
+class RNGRegistry:
+    """
+    | Registry of the random number streams of a run. Every model component draws from its own named stream.
+    Separated streams are derived from the run seed with stream_seed, so the draws of a component do not depend on
+    how many numbers the other components drew or in which order. Streams that are not separated are the main
+    generator of the run, so a registry without separated streams reproduces a run with a single generator.
+    """
+    def __init__(self,
+                 seed=None,
+                 separate=(),
+                 generator: np.random.Generator = None):
+        """
+        | Set up the registry of a run.
+
+        :param seed: Seed of the run, either an integer, a numpy.random.SeedSequence or None.
+        :param separate: Names of the streams with their own generator, or True to separate every stream.
+        :param generator: Main generator of the run. A generator of the seed is created if None.
+        """
+        self.seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.separate = separate if separate is True else frozenset(separate)
+        self.generator = np.random.default_rng(self.seed) if generator is None else generator
+        self.streams = {}
+
+    def is_separate(self,
+                    name: str) -> bool:
+        """
+        | Check whether a stream has its own generator.
+
+        :param name: Name of the stream.
+        :return: True if the stream is separated from the main generator.
+        """
+        return self.separate is True or name in self.separate
+
+    def __getitem__(self,
+                    name: str) -> np.random.Generator:
+        """
+        | Return the generator of a named stream, created on first use.
+
+        :param name: Name of the stream.
+        :return: The numpy.random.Generator of the stream.
+        """
+        if name not in self.streams:
+            self.streams[name] = (np.random.default_rng(stream_seed(self.seed, name)) if self.is_separate(name)
+                                  else self.generator)
+        return self.streams[name]
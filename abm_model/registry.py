@@ -0,0 +1,113 @@
+import numpy as np
+import heapq
+
+
+class AgentRegistry:
+    """
+    | Registry that assigns dense integer slots to the agents of one type. Slots of removed agents are recycled
+    for new agents, so the number of slots stays equal to the largest number of agents alive at the same time.
+    Lookups from agent id to slot and from slot to agent id are O(1).
+    """
+    def __init__(self, prefix: str):
+        """
+        | Set up an empty registry.
+
+        :param prefix: Prefix of the generated agent ids, e.g. 'firm' for ids of the form 'firm_1'.
+        """
+        self.prefix = prefix
+        # active agent ids in order of registration and their slots
+        self.slots = {}
+        # agent id of every slot, None for free slots
+        self.slot_ids = []
+        self.free_slots = []
+        self.next_number = 1
+
+    @property
+    def capacity(self) -> int:
+        """
+        | Number of slots, i.e. the size of arrays indexed by slot.
+        """
+        return len(self.slot_ids)
+
+    def create(self, count: int) -> list:
+        """
+        | Generate and register new unique agent ids.
+
+        :param count: Number of new agents.
+        :return: List of the new agent ids.
+        """
+        new_ids = [f'{self.prefix}_{x}' for x in range(self.next_number, self.next_number + count)]
+        self.next_number += count
+        self.register(new_ids)
+        return new_ids
+
+    def register(self, agent_ids: list) -> np.ndarray:
+        """
+        | Register agents, reusing the lowest free slots first.
+
+        :param agent_ids: List of agent ids.
+        :return: Array with the slots of the agents.
+        """
+        slots = []
+        for agent_id in agent_ids:
+            if self.free_slots:
+                slot = heapq.heappop(self.free_slots)
+                self.slot_ids[slot] = agent_id
+            else:
+                slot = len(self.slot_ids)
+                self.slot_ids.append(agent_id)
+            self.slots[agent_id] = slot
+            slots.append(slot)
+        return np.array(slots, dtype=int)
+
+    def release(self, agent_ids: list):
+        """
+        | Remove agents from the registry and free their slots.
+
+        :param agent_ids: List of agent ids.
+        """
+        for agent_id in agent_ids:
+            slot = self.slots.pop(agent_id)
+            self.slot_ids[slot] = None
+            heapq.heappush(self.free_slots, slot)
+
+    def slot(self, agent_id: str) -> int:
+        """
+        | Slot of an agent.
+
+        :param agent_id: The agent id.
+        :return: The slot of the agent.
+        """
+        return self.slots[agent_id]
+
+    def slots_of(self, agent_ids: list) -> np.ndarray:
+        """
+        | Slots of several agents.
+
+        :param agent_ids: List of agent ids.
+        :return: Array with the slots of the agents.
+        """
+        return np.array([self.slots[agent_id] for agent_id in agent_ids], dtype=int)
+
+    def agent_id(self, slot: int):
+        """
+        | Agent id in a slot.
+
+        :param slot: The slot.
+        :return: The agent id, None if the slot is free.
+        """
+        return self.slot_ids[slot]
+
+    def active_ids(self) -> list:
+        """
+        | Ids of all registered agents in order of registration.
+
+        :return: List of agent ids.
+        """
+        return list(self.slots)
+
+    def __contains__(self, agent_id):
+        return agent_id in self.slots
+
+    def __len__(self):
+        return len(self.slots)
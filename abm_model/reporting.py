@@ -0,0 +1,101 @@
+import argparse
+from abm_model.historic_data import HistoricData
+
+
+def plot_historic_data(historic_data: HistoricData,
+                       path: str = None):
+    """
+    | Plot the main time series of the historic data of a simulation. The figure is drawn without pyplot, so no
+    GUI backend is loaded, and rendered to a file with the Agg backend.
+
+    :param historic_data: The historic data store or a dictionary in the shape of HistoricData.to_dict.
+    :param path: Path of the image file. The figure is only returned if None.
+    :return: The matplotlib Figure.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(25, 12))
+    ax = fig.subplots(2, 3)
+
+    color1='blue'
+    color2='orange'
+    color3='green'
+    color4='black'
+
+    ax[0,0].plot(historic_data['market_price'], color=color1)
+    ax[0,0].set_ylabel('Market Price',color=color1)
+    ax[0,0].tick_params(axis='y', labelcolor=color1)
+    rightAx=ax[0,0].twinx()
+    rightAx.plot(historic_data['average_wage'],color=color2)
+    rightAx.set_ylabel('Average Wage', color=color2)
+    rightAx.tick_params(axis='y', labelcolor=color2)
+    ax[0,0].set_title("Market Price and Wage")
+
+    ax[0,1].plot(historic_data['bank_defaults'], color=color1)
+    ax[0,1].set_ylabel('Bank Defaults',color=color1)
+    ax[0,1].tick_params(axis='y', labelcolor=color1)
+    rightAx=ax[0,1].twinx()
+    rightAx.plot(historic_data['firm_defaults'],color=color2)
+    rightAx.set_ylabel('Firm Defaults', color=color2)
+    rightAx.tick_params(axis='y', labelcolor=color2)
+    ax[0,1].set_title("Bank and Firm Defaults")
+
+    ax[1,0].plot(historic_data['average_firmloan_ir'], color=color1)
+    ax[1,0].plot(historic_data['average_bankloan_ir'], color=color3)
+    ax[1,0].legend(['Firm Loan IR', 'Interbank Loan IR'])
+    ax[1,0].set_ylabel('Interest Rates', color=color4)
+    ax[1,0].tick_params(axis='y', labelcolor=color4)
+    rightAx = ax[1,0].twinx()
+    rightAx.plot(historic_data['average_cds_spread'], color=color2)
+    rightAx.set_ylabel('Spreads', color=color2)
+    rightAx.tick_params(axis='y', labelcolor=color2)
+    ax[1,0].set_title("Interest Rates and Spreads")
+
+    ax[1,1].plot(historic_data['total_firmloan'], color=color1)
+    ax[1,1].plot(historic_data['total_bankloan'], color=color3)
+    ax[1,1].legend(['Firm Loans Total Notional', 'Interbank Loans Total Notional'])
+    ax[1,1].set_ylabel('Loans Total', color=color4)
+    ax[1,1].tick_params(axis='y', labelcolor=color4)
+    rightAx = ax[1,1].twinx()
+    rightAx.plot(historic_data['total_cds_notional'], color=color2)
+    rightAx.set_ylabel('CDS Notional', color=color2)
+    rightAx.tick_params(axis='y', labelcolor=color2)
+    ax[1,1].set_title("Notional Loans and CDS")
+
+    ax[0,2].plot(historic_data['bank_equity'], color=color1)
+    ax[0,2].set_ylabel('Bank Equity',color=color1)
+    ax[0,2].tick_params(axis='y', labelcolor=color1)
+    rightAx=ax[0,2].twinx()
+    rightAx.plot(historic_data['bank_deposits'],color=color2)
+    rightAx.set_ylabel('Bank Deposits', color=color2)
+    rightAx.tick_params(axis='y', labelcolor=color2)
+    ax[0,2].set_title("Bank Equity and Deposits")
+
+    ax[1,2].plot(historic_data['firm_equity'], color=color1)
+    ax[1,2].set_ylabel('Firm Equity',color=color1)
+    ax[1,2].tick_params(axis='y', labelcolor=color1)
+    rightAx=ax[1,2].twinx()
+    rightAx.plot(historic_data['firm_market_power'],color=color2)
+    rightAx.set_ylabel('Fraction Largest Firm', color=color2)
+    rightAx.tick_params(axis='y', labelcolor=color2)
+    ax[1,2].set_title("Firm Equity and Market Power")
+    if path is not None:
+        fig.savefig(path)
+    return fig
+
+
+def main(argv: list = None):
+    """
+    | Command line interface to render the report of a saved simulation run offline.
+
+    :param argv: Command line arguments, sys.argv is used if None.
+    """
+    parser = argparse.ArgumentParser(description='Render the plots of saved historic data.')
+    parser.add_argument('data', help='.npz file written by HistoricData.save')
+    parser.add_argument('--output', default='historic_data.png', help='path of the image file')
+    args = parser.parse_args(argv)
+    plot_historic_data(HistoricData.load(args.data), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+from abm_model.initialization import generate_random_firms_and_banks, generate_new_entities
+from abm_model.grouping import group_loans
+from abm_model.population import agent_values
+from abm_model.analytics import analytics
+from abm_model.markov_model import MarkovModel
+from abm_model.clear_interbank_market import clear_interbank_market
+from abm_model.clear_firm_default import clear_firm_default
+from abm_model.create_network_connections import create_network_connections
+from abm_model.logs import EventLog
+from abm_model.log_sink import NpzSink
+from abm_model.baseclass import BaseAgent
+from abm_model.firms import BaseFirm
+from abm_model.banks import BaseBank, asses_all_loan_requests
+from abm_model.firm_population import FirmPopulation
+from abm_model.bank_population import BankPopulation
+from abm_model.registry import AgentRegistry
+from abm_model.historic_data import HistoricData
+from abm_model.profiling import PhaseProfiler
+from abm_model.stress_test import NetworkSnapshot
+from abm_model.random_streams import RNGRegistry, common_streams
+import itertools
+
+
+class SimulationConfig:
+    """
+    | Configuration of a simulation run. It holds the size of the economy, the CDS market probabilities,
+    the model constants and the Markov Model of the goods market.
+    """
+    def __init__(self,
+                 firms: int = 300,
+                 banks: int = 20,
+                 covered_cds_prob: float = 0.5,
+                 naked_cds_prob: float = 0.1,
+                 policy_rate: float = 0.02,
+                 capital_req: float = 0.9,
+                 max_bank_loan: int = 3,
+                 max_interbank_loan: int = 2,
+                 max_cds_requests: int = 3,
+                 starting_prob: list = None,
+                 transition_matrix: list = None,
+                 states: dict = None,
+                 good_consumption: list = None,
+                 good_consumption_std: list = None,
+                 min_consumption: float = 0.85,
+                 max_consumption: float = 1,
+                 deposit_shock_std: float = 0.02,
+                 dividend_ratio: float = 0.15,
+                 engine: str = 'object',
+                 log_dir: str = None,
+                 log_buffer_rows: int = 100000,
+                 seed: int = None,
+                 verbose: bool = False,
+                 trace_memory: bool = False,
+                 network_snapshots: bool = False,
+                 common_random_numbers: bool = False,
+                 separate_streams: bool = False):
+        """
+        | Set up the configuration of a simulation run.
+
+        :param firms: Number of firms in the economy.
+        :param banks: Number of banks in the economy.
+        :param covered_cds_prob: Probability a bank wants to buy a covered CDS.
+        :param naked_cds_prob: Probability a bank wants to buy a naked CDS.
+        :param policy_rate: The policy rate set by the central bank.
+        :param capital_req: The capital requirement of the banks.
+        :param max_bank_loan: Maximum number of banks a firm can go for a loan.
+        :param max_interbank_loan: Maximum number of banks a bank can go for an interbank loan.
+        :param max_cds_requests: Maximum number of banks a bank can go for a CDS.
+        :param starting_prob: Starting probabilities of the economy states.
+        :param transition_matrix: Transition matrix between the economy states.
+        :param states: Dictionary mapping state indices to state names.
+        :param good_consumption: Average good consumption for the different economy states.
+        :param good_consumption_std: Standard deviation for the good consumption for the different economy states.
+        :param min_consumption: Minimum consumption of goods.
+        :param max_consumption: Maximum consumption of goods.
+        :param deposit_shock_std: Standard deviation of the relative deposit shock of the banks.
+        :param dividend_ratio: Fraction of the equity growth that firms pay out as dividend.
+        :param engine: 'object' for the reference engine with one Firm and Bank object per agent, 'array' for the
+            engine that stores the agents in a FirmPopulation and a BankPopulation and works on their arrays.
+        :param log_dir: Directory to which the event log is streamed in compressed chunks, which must not hold the
+            log of another run. The whole log is kept in memory if None.
+        :param log_buffer_rows: Number of buffered events after which the event log is flushed to log_dir.
+        :param seed: Seed of the random number generator of the run.
+        :param verbose: Print the progress of the simulation.
+        :param trace_memory: Record the peak memory of every phase with tracemalloc, at a considerable cost in speed.
+        :param network_snapshots: Keep a NetworkSnapshot of the interbank network of the last period for stress tests.
+        :param common_random_numbers: Draw the exogenous shocks (economy state, consumption, deposit shocks and the
+            wage, price and supply adjustments) from dedicated streams of the seed, so runs of different scenarios
+            with the same seed share them and can be compared pairwise.
+        :param separate_streams: Give every model component its own random stream of the seed, see RNGRegistry.
+            The draws of a component then do not depend on the call order of the other components. Implies common
+            random numbers. All components share one generator if False, which reproduces the reference runs.
+        """
+        self.firms = firms
+        self.banks = banks
+        self.covered_cds_prob = covered_cds_prob
+        self.naked_cds_prob = naked_cds_prob
+        self.policy_rate = policy_rate
+        self.capital_req = capital_req
+        self.max_bank_loan = max_bank_loan
+        self.max_interbank_loan = max_interbank_loan
+        self.max_cds_requests = max_cds_requests
+        self.starting_prob = [1, 0] if starting_prob is None else starting_prob
+        self.transition_matrix = [[0.7, 0.3], [0.8, 0.2]] if transition_matrix is None else transition_matrix
+        self.states = {0: 'good', 1: 'bad'} if states is None else states
+        self.good_consumption = [0.95, 0.90] if good_consumption is None else good_consumption
+        self.good_consumption_std = [0.1, 0.15] if good_consumption_std is None else good_consumption_std
+        self.min_consumption = min_consumption
+        self.max_consumption = max_consumption
+        self.deposit_shock_std = deposit_shock_std
+        self.dividend_ratio = dividend_ratio
+        self.engine = engine
+        self.log_dir = log_dir
+        self.log_buffer_rows = log_buffer_rows
+        self.seed = seed
+        self.verbose = verbose
+        self.trace_memory = trace_memory
+        self.network_snapshots = network_snapshots
+        self.common_random_numbers = common_random_numbers
+        self.separate_streams = separate_streams
+
+    def to_dict(self) -> dict:
+        """
+        | Return the configuration as a dictionary that can be passed back to the constructor.
+
+        :return: Dictionary with the configuration values.
+        """
+        return dict(self.__dict__)
+
+
+class Simulation:
+    """
+    | Simulation engine that advances the economy period by period. All randomness is drawn from the named streams
+    of an RNGRegistry owned by the simulation, so two runs with the same seed are identical.
+    """
+    # class level variables of the agents that hold the state of a run
+    _shared_state = [(BaseAgent, 'rng'), (BaseAgent, 'streams'), (BaseAgent, 'policy_rate'),
+                     (BaseAgent, 'firm_ids'), (BaseAgent, 'firm_id_set'), (BaseAgent, 'bank_ids'),
+                     (BaseAgent, 'max_bank_loan'), (BaseAgent, 'max_interbank_loan'), (BaseAgent, 'max_cds_requests'),
+                     (BaseFirm, 'market_price'), (BaseFirm, 'min_wage'), (BaseFirm, 'max_leverage'),
+                     (BaseBank, 'h_theta')]
+
+    def __init__(self,
+                 config: SimulationConfig = None,
+                 seed: int = None):
+        """
+        | Generate the initial economy of the simulation.
+
+        :param config: Configuration of the run. The default configuration is used if None.
+        :param seed: Seed of the random number generator. Overrides the seed of the configuration.
+        """
+        self.config = SimulationConfig() if config is None else config
+        self.seed = self.config.seed if seed is None else seed
+        # random streams of the components, separate streams of the seed for the exogenous shocks with common
+        # random numbers and for every component with separate streams
+        if self.config.separate_streams:
+            separate = True
+        else:
+            separate = common_streams if self.config.common_random_numbers else ()
+        self.streams = RNGRegistry(self.seed, separate=separate)
+        self.rng = self.streams.generator
+        self.t = 0
+
+        self.firm_registry = AgentRegistry('firm')
+        self.bank_registry = AgentRegistry('bank')
+        firms_idx = self.firm_registry.create(self.config.firms)
+        banks_idx = self.bank_registry.create(self.config.banks)
+        (self.firms, self.banks, self.base_agent,
+         self.base_firm, self.base_bank) = generate_random_firms_and_banks(firms_idx,
+                                                                           banks_idx,
+                                                                           self.config.covered_cds_prob,
+                                                                           self.config.naked_cds_prob,
+                                                                           policy_rate=self.config.policy_rate,
+                                                                           capital_req=self.config.capital_req,
+                                                                           max_bank_loan=self.config.max_bank_loan,
+                                                                           max_interbank_loan=(
+                                                                               self.config.max_interbank_loan),
+                                                                           max_cds_requests=(
+                                                                               self.config.max_cds_requests),
+                                                                           streams=self.streams)
+        if self.config.engine == 'array':
+            self.firms = FirmPopulation.from_firms(self.firms)
+            self.banks = BankPopulation.from_banks(self.banks)
+        self.economy_state = MarkovModel(starting_prob=self.config.starting_prob,
+                                         transition_matrix=self.config.transition_matrix,
+                                         states=self.config.states,
+                                         rng=self.streams['economy_state'])
+        if self.config.log_dir is None:
+            self.logs = EventLog()
+        else:
+            self.logs = EventLog(sink=NpzSink(self.config.log_dir), max_rows=self.config.log_buffer_rows)
+        self.historic_data = HistoricData(bank_slots=self.bank_registry.capacity)
+        # iterations and residual of the last interbank clearing
+        self.clearing_info = {}
+        self.network_snapshot = None
+        self.profiler = PhaseProfiler(trace_memory=self.config.trace_memory)
+        self._save_shared_state()
+
+    def _save_shared_state(self):
+        """
+        | Store the class level agent variables of this run, so that several simulations can live in one process.
+        """
+        self._state = [getattr(cls, name) for cls, name in self._shared_state]
+
+    def _restore_shared_state(self):
+        """
+        | Reinstall the class level agent variables of this run.
+        """
+        for (cls, name), value in zip(self._shared_state, self._state):
+            setattr(cls, name, value)
+
+    def _print(self, message: str):
+        """
+        | Print a progress message if the simulation is verbose.
+
+        :param message: The message to print.
+        """
+        if self.config.verbose:
+            print(message)
+
+    def step(self) -> HistoricData:
+        """
+        | Simulate one period of the economy.
+
+        :return: The historic data of the simulation.
+        """
+        self._restore_shared_state()
+        config = self.config
+        profiler = self.profiler
+        t = self.t
+        firms, banks = self.firms, self.banks
+        base_agent, base_firm = self.base_agent, self.base_firm
+
+        # for each firm compute expected supply and see who wants loans
+        self._print(f"Period {t}: Compute expected supply and price")
+        with profiler.phase('expected_supply'):
+            if config.engine == 'array':
+                firms.compute_expected_supply_and_prices()
+                firms.check_loan_desire_and_choose_loans()
+            else:
+                for firm_id in firms.keys():
+                    firms[firm_id].compute_expected_supply_and_prices()
+                    firms[firm_id].check_loan_desire_and_choose_loans()
+
+        # iterate through banks and see which ones accept the loans
+        with profiler.phase('loan_assessment'):
+            loan_requests = list(itertools.chain(*agent_values(firms, 'potential_lenders')))
+            if config.engine == 'array':
+                banks.update_current_deposits()
+                banks.update_max_credit()
+            else:
+                for bank_id in banks.keys():
+                    banks[bank_id].update_current_deposits()
+                    banks[bank_id].update_max_credit()
+            loan_offers = group_loans(asses_all_loan_requests(banks, loan_requests), list(firms), 'borrower')
+
+        # start the network allocation of loans and cds
+        self._print(f"Period {t}: Create network connections")
+        with profiler.phase('create_network_connections'):
+            firms, banks, interbank_contracts, self.logs, period_t_transactions = create_network_connections(
+                loan_offers,
+                banks,
+                firms,
+                self.logs,
+                base_agent.bank_ids,
+                config.covered_cds_prob,
+                config.naked_cds_prob,
+                t,
+                self.streams,
+                vectorized_cds=config.engine != 'object' or config.separate_streams)
+
+        # Figure out firm default and update CDS recovery rate accordingly
+        self._print(f"Period {t}: Get defaulting firms")
+        with profiler.phase('clear_firm_default'):
+            # compute market price
+            if config.engine == 'array':
+                base_firm.change_market_price(firms.market_price_estimate())
+            else:
+                base_firm.change_market_price(sum([firm.price * firm.supply for _, firm in firms.items()]) /
+                                              sum([firm.supply for _, firm in firms.items()]))
+            firms, banks, defaulted_firms = clear_firm_default(firms,
+                                                               banks,
+                                                               self.economy_state,
+                                                               config.good_consumption,
+                                                               config.good_consumption_std,
+                                                               config.min_consumption,
+                                                               config.max_consumption,
+                                                               rng=self.streams['consumption'])
+
+        # do deposit change
+        with profiler.phase('deposit_shocks'):
+            for bank_id in base_agent.bank_ids:
+                rv = self.streams['deposit_shocks'].normal(0, config.deposit_shock_std)
+                banks[bank_id].deposit_change = rv * banks[bank_id].deposits
+                banks[bank_id].deposits += banks[bank_id].deposit_change
+
+        # now figure out the banks network payments
+        self._print(f"Period {t}: Get defaulting banks")
+        with profiler.phase('clear_interbank_market'):
+            self.clearing_info = {}
+            if config.network_snapshots:
+                self.network_snapshot = NetworkSnapshot.from_market(banks, firms, interbank_contracts, defaulted_firms)
+            banks, defaulted_banks = clear_interbank_market(banks,
+                                                            firms,
+                                                            base_agent.bank_ids,
+                                                            interbank_contracts,
+                                                            defaulted_firms,
+                                                            clearing_info=self.clearing_info,
+                                                            registry=self.bank_registry)
+        self._print(f"Period {t}: {self.clearing_info['clearing_defaults']} bank defaults from clearing, "
+                    f"{len(defaulted_banks)} in total")
+
+        with profiler.phase('analytics'):
+            # add logs for default
+            for firm_id in defaulted_firms:
+                self.logs.record_default(t, firm_id, firms[firm_id].equity)
+            for bank_id in defaulted_banks:
+                self.logs.record_default(t, bank_id, banks[bank_id].equity, bank=True)
+
+            # get historic values for analytics
+            self.historic_data = analytics(self.historic_data,
+                                           banks,
+                                           t,
+                                           None,
+                                           self.economy_state,
+                                           defaulted_banks,
+                                           base_firm,
+                                           base_agent,
+                                           defaulted_firms,
+                                           firms,
+                                           period_t_transactions,
+                                           bank_registry=self.bank_registry)
+
+        with profiler.phase('entity_regeneration'):
+            # reset banks and firms and remove defaulting ones
+            if config.engine == 'array':
+                banks.remove(defaulted_banks)
+                banks.reset_variables()
+                firms.remove(defaulted_firms)
+                firms.reset_variables()
+                if t > 0:
+                    firms.pay_dividends(config.dividend_ratio)
+            else:
+                banks = {bank_id: bank_entity for bank_id, bank_entity in banks.items()
+                         if bank_id not in defaulted_banks}
+                for bank_id in banks:
+                    banks[bank_id].reset_variables()
+                firms = {firm_id: firm_entity for firm_id, firm_entity in firms.items()
+                         if firm_id not in defaulted_firms}
+                for firm_id in firms:
+                    firms[firm_id].reset_variables()
+                    if t > 0:
+                        dividend = max((firms[firm_id].equity / firms[firm_id].prev_equity) - 1, 0)
+                        firms[firm_id].equity -= config.dividend_ratio * dividend * firms[firm_id].equity
+
+            # create new bank entities and update the bank and firm ids list in the base agent
+            self.firm_registry.release(defaulted_firms)
+            self.bank_registry.release(defaulted_banks)
+            new_firm_ids = self.firm_registry.create(len(defaulted_firms))
+            new_bank_ids = self.bank_registry.create(len(defaulted_banks))
+            firms, banks = generate_new_entities(new_bank_ids,
+                                                 new_firm_ids,
+                                                 banks,
+                                                 firms,
+                                                 base_firm,
+                                                 config.covered_cds_prob,
+                                                 config.naked_cds_prob,
+                                                 capital_req=config.capital_req)
+
+            # update base agent for new IDs
+            base_agent.change_firm_ids(self.firm_registry.active_ids())
+            base_agent.change_bank_ids(self.bank_registry.active_ids())
+
+            # do calculations for next period
+            self.economy_state.get_next_state()
+
+        self.firms, self.banks = firms, banks
+        self.t += 1
+        self._save_shared_state()
+        self._print(f"Period {t} finished in {profiler.end_period():.3f} seconds")
+        return self.historic_data
+
+    def profile_report(self) -> dict:
+        """
+        | Report of the wall time, and if traced the peak memory, of every phase of the simulated periods.
+
+        :return: The report, see PhaseProfiler.report.
+        """
+        return self.profiler.report()
+
+    def run(self, T: int) -> HistoricData:
+        """
+        | Simulate T further periods of the economy. If the event log is streamed to disk, the remaining buffered
+        events are flushed at the end.
+
+        :param T: Number of periods to simulate.
+        :return: The historic data of the simulation.
+        """
+        self.historic_data.reserve(self.t + T, self.bank_registry.capacity)
+        for _ in range(T):
+            self.step()
+        self.logs.flush()
+        return self.historic_data
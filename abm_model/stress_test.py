@@ -0,0 +1,242 @@
+from abm_model.loan import Loan
+from abm_model.population import agent_values
+from abm_model.clear_firm_default import firm_loan_arrays
+from abm_model.clear_interbank_market import (batched_clearing_vector, clearing_vector, liability_matrix,
+                                              sparse_threshold)
+import numpy as np
+
+# number of matrix entries of a batch of scenarios that are cleared together
+batch_entries = 2 ** 24
+
+
+class NetworkSnapshot:
+    """
+    | Frozen copy of the interbank network of one period, taken after the credit market and before the interbank
+    clearing. It holds the firm loans and the interbank contracts as arrays together with the balance sheet
+    values of the banks that enter the clearing, so that the clearing can be repeated under hypothetical
+    scenarios without touching the agents.
+    """
+    def __init__(self,
+                 bank_ids: list,
+                 firm_ids: list,
+                 equity,
+                 deposits,
+                 current_deposits,
+                 loans: tuple,
+                 liabilities: tuple,
+                 cds: tuple,
+                 observed: dict = None):
+        """
+        | Set up the snapshot from its arrays. Banks and firms are referred to by their position in bank_ids and
+        firm_ids.
+
+        :param bank_ids: List of bank ids.
+        :param firm_ids: List of firm ids.
+        :param equity: Equity of each bank.
+        :param deposits: Deposits of each bank before the deposit shock.
+        :param current_deposits: Deposits of each bank that are not lent out.
+        :param loans: Tuple with the borrowing firm, the lending bank and the amount due of every firm loan.
+        :param liabilities: Tuple with the debtor bank, the creditor bank and the amount due of every liability that
+            does not depend on the scenario: interbank loans and CDS premiums.
+        :param cds: Tuple with the seller, the buyer, the reference firm and the notional amount of every CDS.
+        :param observed: Optional dictionary with the firm defaults, recovery rates and deposit shocks of the period.
+        """
+        self.bank_ids = list(bank_ids)
+        self.firm_ids = list(firm_ids)
+        # copies, the values of a population are its live arrays
+        self.equity = np.array(equity, dtype=float)
+        self.deposits = np.array(deposits, dtype=float)
+        self.current_deposits = np.array(current_deposits, dtype=float)
+        self.loan_borrowers, self.loan_lenders, self.loan_amounts_due = map(np.asarray, loans)
+        self.liability_rows, self.liability_cols, self.liability_values = map(np.asarray, liabilities)
+        self.cds_sellers, self.cds_buyers, self.cds_reference, self.cds_notional = map(np.asarray, cds)
+        self.observed = observed
+
+    @classmethod
+    def from_market(cls,
+                    banks: dict,
+                    firms: dict,
+                    interbank_contracts: list,
+                    defaulted_firms: list = None):
+        """
+        | Take a snapshot of the market right before clear_interbank_market. If the deposit shocks have already
+        been applied they are taken out of the deposits and kept, together with the firm defaults and the recovery
+        rates, as the observed scenario.
+
+        :param banks: Dictionary of banks or a BankPopulation.
+        :param firms: Dictionary of firms or a FirmPopulation.
+        :param interbank_contracts: List of the interbank loans and CDS of the period.
+        :param defaulted_firms: Optional list of the firms that defaulted in the period.
+        :return: The NetworkSnapshot.
+        """
+        bank_ids, firm_ids = list(banks), list(firms)
+        bank_positions = {bank_id: i for i, bank_id in enumerate(bank_ids)}
+        firm_positions = {firm_id: i for i, firm_id in enumerate(firm_ids)}
+        deposit_change = np.array([0 if change is None else change
+                                   for change in agent_values(banks, 'deposit_change')], dtype=float)
+        deposits = np.asarray(agent_values(banks, 'deposits'), dtype=float) - deposit_change
+        loans = [contract for contract in interbank_contracts if type(contract) == Loan]
+        cds = [contract for contract in interbank_contracts if type(contract) != Loan]
+        liabilities = (np.array([bank_positions[loan.borrower] for loan in loans] +
+                                [bank_positions[contract.buyer] for contract in cds], dtype=int),
+                       np.array([bank_positions[loan.lender] for loan in loans] +
+                                [bank_positions[contract.seller] for contract in cds], dtype=int),
+                       np.array([loan.notional_amount * (1 + loan.interest_rate) for loan in loans] +
+                                [contract.spread * contract.notional_amount for contract in cds], dtype=float))
+        cds = (np.array([bank_positions[contract.seller] for contract in cds], dtype=int),
+               np.array([bank_positions[contract.buyer] for contract in cds], dtype=int),
+               np.array([firm_positions[contract.reference_entity] for contract in cds], dtype=int),
+               np.array([contract.notional_amount for contract in cds], dtype=float))
+        observed = None
+        if defaulted_firms is not None:
+            defaulted = np.zeros(len(firm_ids), dtype=bool)
+            defaulted[[firm_positions[firm_id] for firm_id in defaulted_firms]] = True
+            observed = {'defaulted_firms': defaulted,
+                        'recovery_rates': np.array(agent_values(firms, 'recovery_rate'), dtype=float),
+                        'deposit_shocks': np.divide(deposit_change, deposits, out=np.zeros_like(deposits),
+                                                    where=deposits != 0)}
+        return cls(bank_ids,
+                   firm_ids,
+                   agent_values(banks, 'equity'),
+                   deposits,
+                   agent_values(banks, 'current_deposits'),
+                   firm_loan_arrays(firms, banks),
+                   liabilities,
+                   cds,
+                   observed=observed)
+
+    def firm_mask(self, scenarios: list) -> np.ndarray:
+        """
+        | Convert lists of defaulted firm ids into a scenario matrix of defaulted-firm masks.
+
+        :param scenarios: List with one list of defaulted firm ids per scenario.
+        :return: Boolean array of shape (scenarios, firms).
+        """
+        positions = {firm_id: i for i, firm_id in enumerate(self.firm_ids)}
+        mask = np.zeros((len(scenarios), len(self.firm_ids)), dtype=bool)
+        for s, defaulted_firms in enumerate(scenarios):
+            mask[s, [positions[firm_id] for firm_id in defaulted_firms]] = True
+        return mask
+
+    def liabilities(self,
+                    defaulted_firms: np.ndarray,
+                    recovery_rates: np.ndarray,
+                    sparse: bool = False):
+        """
+        | Liability matrices of a batch of scenarios. The protection leg of a CDS is owed by the seller to the
+        buyer if the reference firm defaults in the scenario.
+
+        :param defaulted_firms: Boolean array of shape (scenarios, firms).
+        :param recovery_rates: Array of shape (scenarios, firms) with the recovery rates of the firms.
+        :param sparse: Return a list of one sparse matrix per scenario instead of a dense array.
+        :return: Array of shape (scenarios, banks, banks), or a list of sparse matrices.
+        """
+        num_banks = len(self.bank_ids)
+        protection = (defaulted_firms[:, self.cds_reference] *
+                      self.cds_notional * (1 - np.nan_to_num(recovery_rates[:, self.cds_reference])))
+        if sparse:
+            rows = np.concatenate([self.liability_rows, self.cds_sellers])
+            cols = np.concatenate([self.liability_cols, self.cds_buyers])
+            return [liability_matrix(rows, cols, np.concatenate([self.liability_values, values]), num_banks,
+                                     sparse=True)
+                    for values in protection]
+        base = liability_matrix(self.liability_rows, self.liability_cols, self.liability_values, num_banks,
+                                sparse=False)
+        liabilities = np.repeat(base[None], len(defaulted_firms), axis=0)
+        np.add.at(liabilities, (np.arange(len(defaulted_firms))[:, None], self.cds_sellers, self.cds_buyers),
+                  protection)
+        return liabilities
+
+    def initial_wealth(self,
+                       defaulted_firms: np.ndarray,
+                       recovery_rates: np.ndarray,
+                       deposit_shocks: np.ndarray) -> np.ndarray:
+        """
+        | Wealth of the banks before the interbank payments in a batch of scenarios, see clear_interbank_market:
+        equity, repayments of the firm loans and deposit outflows.
+
+        :param defaulted_firms: Boolean array of shape (scenarios, firms).
+        :param recovery_rates: Array of shape (scenarios, firms) with the recovery rates of the firms.
+        :param deposit_shocks: Array of shape (scenarios, banks) with the relative deposit shocks.
+        :return: Array of shape (scenarios, banks).
+        """
+        repaid = np.where(defaulted_firms[:, self.loan_borrowers], recovery_rates[:, self.loan_borrowers], 1)
+        money_from_firm_loans = np.zeros((len(defaulted_firms), len(self.bank_ids)))
+        np.add.at(money_from_firm_loans, (np.arange(len(defaulted_firms))[:, None], self.loan_lenders),
+                  repaid * self.loan_amounts_due)
+        return self.equity + money_from_firm_loans + np.minimum(deposit_shocks * self.deposits, 0)
+
+
+def stress_test(snapshot: NetworkSnapshot,
+                defaulted_firms,
+                deposit_shocks=None,
+                recovery_rates=0.3,
+                batch_size: int = None) -> dict:
+    """
+    | Clear the interbank market of a network snapshot under a batch of scenarios, without side effects on the
+    agents. A scenario is a set of defaulted firms, the recovery rates of the defaulted firms and a relative
+    deposit shock per bank. The scenarios are cleared in batches with batched_clearing_vector, or one by one with
+    the sparse clearing_vector from sparse_threshold banks on. As in clear_interbank_market, a bank defaults if it
+    defaults in the clearing or if its earnings do not cover its deposit outflows.
+
+    :param snapshot: The network snapshot.
+    :param defaulted_firms: Boolean array of shape (scenarios, firms) with the defaulted firms, see
+        NetworkSnapshot.firm_mask.
+    :param deposit_shocks: Array of relative deposit shocks of shape (scenarios, banks), or a single vector for
+        all scenarios. No shocks if None.
+    :param recovery_rates: Recovery rate of the defaulted firms: a single value, one value per firm or an array of
+        shape (scenarios, firms).
+    :param batch_size: Number of scenarios cleared together. Chosen such that a batch holds about batch_entries
+        matrix entries if None.
+    :return: Dictionary with the bank ids and, with one row per scenario, the initial wealth, the payments, the
+        earnings, the clearing defaults, the defaults, the number of iterations and the residuals.
+    """
+    defaulted_firms = np.atleast_2d(np.asarray(defaulted_firms, dtype=bool))
+    num_scenarios, num_banks = len(defaulted_firms), len(snapshot.bank_ids)
+    deposit_shocks = np.broadcast_to(np.zeros(num_banks) if deposit_shocks is None else
+                                     np.asarray(deposit_shocks, dtype=float), (num_scenarios, num_banks))
+    recovery_rates = np.broadcast_to(np.asarray(recovery_rates, dtype=float), defaulted_firms.shape)
+    initial_wealth = snapshot.initial_wealth(defaulted_firms, recovery_rates, deposit_shocks)
+    sparse = num_banks >= sparse_threshold
+    if batch_size is None:
+        batch_size = 1 if sparse else max(1, batch_entries // max(num_banks * num_banks, 1))
+    payments = np.zeros((num_scenarios, num_banks))
+    inflows = np.zeros((num_scenarios, num_banks))
+    clearing_defaults = np.zeros((num_scenarios, num_banks), dtype=bool)
+    iterations = np.zeros(num_scenarios, dtype=int)
+    residual = np.zeros(num_scenarios)
+    for start in range(0, num_scenarios, batch_size):
+        batch = slice(start, min(start + batch_size, num_scenarios))
+        liabilities = snapshot.liabilities(defaulted_firms[batch], recovery_rates[batch], sparse=sparse)
+        if sparse:
+            results = zip(*[clearing_vector(matrix, wealth)
+                            for matrix, wealth in zip(liabilities, initial_wealth[batch])])
+        else:
+            results = batched_clearing_vector(liabilities, initial_wealth[batch])
+        for output, result in zip((payments, clearing_defaults, inflows, iterations, residual), results):
+            output[batch] = result
+    earnings = initial_wealth + inflows - payments
+    deposit_change = deposit_shocks * snapshot.deposits
+    money_for_deposits = snapshot.deposits + np.minimum(deposit_change, 0) - snapshot.current_deposits
+    return {'bank_ids': snapshot.bank_ids,
+            'initial_wealth': initial_wealth,
+            'payments': payments,
+            'earnings': earnings,
+            'clearing_defaults': clearing_defaults,
+            'defaults': clearing_defaults | (earnings < money_for_deposits),
+            'iterations': iterations,
+            'residual': residual}
+
+
+def observed_scenario(snapshot: NetworkSnapshot) -> dict:
+    """
+    | The scenario that was realised in the period of the snapshot, as keyword arguments of stress_test.
+
+    :param snapshot: A network snapshot taken with the defaulted firms of the period.
+    :return: Dictionary with the defaulted firms, the deposit shocks and the recovery rates.
+    """
+    if snapshot.observed is None:
+        raise ValueError('The snapshot was taken without the defaulted firms of the period.')
+    return {'defaulted_firms': snapshot.observed['defaulted_firms'][None],
+            'deposit_shocks': snapshot.observed['deposit_shocks'][None],
+            'recovery_rates': np.nan_to_num(snapshot.observed['recovery_rates'], nan=1)[None]}
@@ -0,0 +1,219 @@
+from concurrent.futures import ProcessPoolExecutor
+from abm_model.simulation import SimulationConfig
+from abm_model.ensemble import spawn_seeds, member_config, run_simulation
+import numpy as np
+import itertools
+import argparse
+import hashlib
+import pickle
+import json
+import os
+
+# configuration values that do not change the results of a run and are left out of the cache key
+output_settings = ('seed', 'verbose', 'log_dir', 'log_buffer_rows', 'trace_memory', 'network_snapshots')
+
+
+def grid(**values) -> list[dict]:
+    """
+    | Build the full factorial grid over the given parameter values.
+
+    :param values: For each configuration parameter the list of values to sweep.
+    :return: List of parameter dictionaries, one per grid cell.
+    """
+    names = list(values.keys())
+    return [dict(zip(names, cell)) for cell in itertools.product(*[values[name] for name in names])]
+
+
+def latin_hypercube(bounds: dict,
+                    samples: int,
+                    seed=None) -> list[dict]:
+    """
+    | Draw a Latin hypercube sample over the given parameter bounds. Parameters whose bounds are both
+    integers are rounded to integers.
+
+    :param bounds: For each configuration parameter a tuple (lower bound, upper bound).
+    :param samples: Number of samples.
+    :param seed: Seed of the sampling.
+    :return: List of parameter dictionaries, one per sample.
+    """
+    rng = np.random.default_rng(seed)
+    points = [{} for _ in range(samples)]
+    for name, (low, high) in bounds.items():
+        strata = (rng.permutation(samples) + rng.uniform(size=samples)) / samples
+        values = low + strata * (high - low)
+        for point, value in zip(points, values):
+            point[name] = int(round(value)) if isinstance(low, int) and isinstance(high, int) else float(value)
+    return points
+
+
+def cell_key(config: SimulationConfig,
+             seed,
+             runs: int,
+             T: int) -> str:
+    """
+    | Compute the cache key of a sweep cell as a hash of the configuration, the seed, the runs and the horizon.
+
+    :param config: Configuration of the cell.
+    :param seed: Root seed of the cell.
+    :param runs: Number of runs in the cell.
+    :param T: Number of periods per run.
+    :return: Hexadecimal hash of the cell.
+    """
+    parameters = {key: value for key, value in config.to_dict().items() if key not in output_settings}
+    payload = json.dumps({'config': parameters, 'seed': seed, 'runs': runs, 'T': T}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_cell(cache_dir: str,
+              key: str):
+    """
+    | Load the results of a sweep cell from the cache.
+
+    :param cache_dir: Directory of the cache.
+    :param key: Cache key of the cell.
+    :return: The list of historic data of the cell or None if it is not cached.
+    """
+    path = os.path.join(cache_dir, f'{key}.pkl')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        return pickle.load(file)['results']
+
+
+def store_cell(cache_dir: str,
+               key: str,
+               parameters: dict,
+               results: list):
+    """
+    | Store the results of a sweep cell in the cache.
+
+    :param cache_dir: Directory of the cache.
+    :param key: Cache key of the cell.
+    :param parameters: The swept parameters of the cell.
+    :param results: The list of historic data of the cell.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{key}.pkl')
+    with open(path + '.tmp', 'wb') as file:
+        pickle.dump({'parameters': parameters, 'results': results}, file)
+    os.replace(path + '.tmp', path)
+
+
+def run_sweep(points: list[dict],
+              runs: int,
+              T: int,
+              seed: int = None,
+              base_config: SimulationConfig = None,
+              cache_dir: str = None,
+              max_workers: int = None) -> list[tuple]:
+    """
+    | Run a parameter sweep. Every cell runs the same spawned seeds, so cells are compared on common seeds.
+    Cells found in the cache are loaded, all other runs are executed in parallel and stored in the cache. Runs
+    without a seed are not reproducible, so the cache is only used if a seed is given. If the event log is streamed
+    to disk, run n of a cell writes it to the subdirectory cell key/run_n of log_dir.
+
+    :param points: List of parameter dictionaries, e.g. from grid or latin_hypercube.
+    :param runs: Number of runs per cell.
+    :param T: Number of periods per run.
+    :param seed: Root seed of every cell. Nothing is cached if None.
+    :param base_config: Configuration of the parameters not swept. The default configuration is used if None.
+    :param cache_dir: Directory of the result cache. No caching is done if None.
+    :param max_workers: Number of worker processes. Defaults to the number of cores; 1 runs in-process.
+    :return: List of tuples (parameters, list of historic data), one per cell.
+    """
+    base = (SimulationConfig() if base_config is None else base_config).to_dict()
+    cache_dir = None if seed is None else cache_dir
+    configs = [SimulationConfig(**{**base, **point}) for point in points]
+    keys = [cell_key(config, seed, runs, T) for config in configs]
+    results = [load_cell(cache_dir, key) if cache_dir is not None else None for key in keys]
+
+    # run every missing (cell, run) pair as a separate job to balance the load
+    missing = [i for i in range(len(points)) if results[i] is None]
+    seeds = spawn_seeds(seed, runs)
+    jobs = [(member_config(configs[i], keys[i], f'run_{n}'), run_seed) for i in missing
+            for n, run_seed in enumerate(seeds)]
+    if max_workers == 1:
+        outputs = [run_simulation(run_config, run_seed, T) for run_config, run_seed in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            outputs = list(executor.map(run_simulation, [run_config for run_config, _ in jobs],
+                                        [run_seed for _, run_seed in jobs], [T] * len(jobs)))
+    for n, i in enumerate(missing):
+        results[i] = outputs[n * runs:(n + 1) * runs]
+        if cache_dir is not None:
+            store_cell(cache_dir, keys[i], points[i], results[i])
+    return list(zip(points, results))
+
+
+def paired_difference(results: list,
+                      baseline: list,
+                      name: str) -> tuple:
+    """
+    | Compare the runs of two cells pairwise, run by run on the common seeds. With common random numbers the
+    paired differences have a much smaller variance than the difference of two independent means.
+
+    :param results: List of historic data of a cell.
+    :param baseline: List of historic data of the baseline cell, run with the same seeds.
+    :param name: Name of the metric, summed over the periods of each run.
+    :return: A tuple containing the mean of the paired differences and its standard error.
+    """
+    differences = np.array([np.sum(result[name]) - np.sum(base[name]) for result, base in zip(results, baseline)])
+    standard_error = np.std(differences, ddof=1) / np.sqrt(len(differences)) if len(differences) > 1 else np.nan
+    return float(np.mean(differences)), float(standard_error)
+
+
+def parse_value(value: str):
+    """
+    | Parse a command line parameter value into an int, a float or a string.
+
+    :param value: The command line value.
+    :return: The parsed value.
+    """
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def main(argv: list = None):
+    """
+    | Command line interface of the parameter sweep. Prints the average number of defaults per cell.
+
+    :param argv: Command line arguments. sys.argv is used if None.
+    """
+    parser = argparse.ArgumentParser(description='Parameter sweep of the systemic risk model.')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help='grid values of a parameter, or NAME=LOW:HIGH bounds together with --lhs')
+    parser.add_argument('--lhs', type=int, default=None, help='number of Latin hypercube samples')
+    parser.add_argument('--runs', type=int, default=10, help='number of runs per cell')
+    parser.add_argument('--T', type=int, default=400, help='number of periods per run')
+    parser.add_argument('--seed', type=int, default=0, help='root seed of every cell')
+    parser.add_argument('--cache', default='.sweep_cache', help='directory of the result cache')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--common-random-numbers', action='store_true',
+                        help='share the exogenous shocks across cells and compare every cell to the first one')
+    args = parser.parse_args(argv)
+
+    parameters = dict(param.split('=', 1) for param in args.param)
+    if args.lhs is not None:
+        points = latin_hypercube({name: tuple(parse_value(x) for x in value.split(':'))
+                                  for name, value in parameters.items()}, args.lhs, seed=args.seed)
+    else:
+        points = grid(**{name: [parse_value(x) for x in value.split(',')] for name, value in parameters.items()})
+    cells = run_sweep(points, args.runs, args.T, seed=args.seed,
+                      base_config=SimulationConfig(common_random_numbers=args.common_random_numbers),
+                      cache_dir=args.cache, max_workers=args.workers)
+    for point, results in cells:
+        bank_defaults = np.mean([sum(result['bank_defaults']) for result in results])
+        firm_defaults = np.mean([sum(result['firm_defaults']) for result in results])
+        print(f'{point}: bank defaults {bank_defaults:.2f}, firm defaults {firm_defaults:.2f}')
+        if args.common_random_numbers and point is not cells[0][0]:
+            for name in ('bank_defaults', 'firm_defaults'):
+                difference, standard_error = paired_difference(results, cells[0][1], name)
+                print(f'    {name} vs {cells[0][0]}: {difference:+.2f} +/- {standard_error:.2f}')
+
+
+if __name__ == '__main__':
+    main()
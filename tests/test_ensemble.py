@@ -0,0 +1,30 @@
+from abm_model.simulation import SimulationConfig
+from abm_model.ensemble import run_ensemble
+from abm_model.sweep import run_sweep
+from abm_model.log_sink import chunk_files, read_event_log
+import numpy as np
+import os
+
+
+def test_ensemble_logs_every_run_to_its_own_directory(tmp_path):
+    log_dir = str(tmp_path / 'events')
+    config = SimulationConfig(firms=30, banks=4, log_dir=log_dir, log_buffer_rows=50, seed=1)
+    results = run_ensemble(config, runs=2, T=3, seed=1, max_workers=1)
+    assert len(results) == 2
+    assert sorted(os.listdir(log_dir)) == ['run_0', 'run_1']
+    for run in ('run_0', 'run_1'):
+        assert len(chunk_files(os.path.join(log_dir, run))) > 0
+        periods = np.concatenate([view.period for view in read_event_log(os.path.join(log_dir, run))])
+        assert np.all(np.diff(periods) >= 0)
+
+
+def test_sweep_logs_every_run_to_its_own_directory(tmp_path):
+    log_dir = str(tmp_path / 'events')
+    config = SimulationConfig(firms=30, banks=4, log_dir=log_dir, log_buffer_rows=50)
+    cells = run_sweep([{'covered_cds_prob': 0.5}, {'covered_cds_prob': 0.0}], runs=2, T=3, seed=1,
+                      base_config=config, max_workers=1)
+    assert len(cells) == 2
+    cell_dirs = os.listdir(log_dir)
+    assert len(cell_dirs) == 2
+    for cell_dir in cell_dirs:
+        assert sorted(os.listdir(os.path.join(log_dir, cell_dir))) == ['run_0', 'run_1']
@@ -0,0 +1,17 @@
+from abm_model.simulation import Simulation, SimulationConfig
+from abm_model.log_sink import chunk_files, read_event_log
+import numpy as np
+import pytest
+
+
+def test_rerun_into_existing_log_dir(tmp_path):
+    log_dir = str(tmp_path / 'events')
+    Simulation(SimulationConfig(seed=1, log_dir=log_dir, log_buffer_rows=200)).run(3)
+    chunks = chunk_files(log_dir)
+    periods = np.concatenate([view.period for view in read_event_log(log_dir)])
+    with pytest.raises(FileExistsError):
+        Simulation(SimulationConfig(seed=1, log_dir=log_dir, log_buffer_rows=200))
+    # the log of the first run is left untouched
+    assert chunk_files(log_dir) == chunks
+    assert np.array_equal(np.concatenate([view.period for view in read_event_log(log_dir)]), periods)
+    assert np.all(np.diff(periods) >= 0)